@@ -1,16 +1,28 @@
+import os
+
 from aqt import mw, gui_hooks
-from aqt.utils import qconnect
-from aqt.qt import QAction
+from aqt.utils import qconnect, tooltip
+from aqt.operations import CollectionOp, QueryOp
+from aqt.qt import QAction, QMessageBox
 
 from .ui import SonaveebDialog
+from .ui.refresh import refresh_deck_notes
 from .sonaveeb import Sonaveeb
+from . import gtranslate
 from .notetypes import NoteTypeManager
+from .notes import (
+    NoteIndex, fill_word_ids, find_legacy_notes, is_migrated,
+    WORD_IDS_MIGRATED, WORD_IDS_MIGRATION_OFFERED
+)
+from .cache import ResponseCache
+from .resilience import RequestPolicy
+from .globals import REQUEST_WORKERS, TRANSLATION_WORKERS
 
 
 def open_sonaveeb_dialog():
     global window
     if window is None:
-        window = SonaveebDialog(notetype_manager, sonaveeb)
+        window = SonaveebDialog(notetype_manager, sonaveeb, note_index)
     window.show()
 
 
@@ -19,11 +31,122 @@ def destroy_sonaveeb_dialog():
     window = None
 
 
+def check_legacy_notes():
+    '''Offer to fill Word ID of legacy Sõnaveeb notes, once per collection.'''
+    if is_migrated(mw.col) or mw.col.get_config(WORD_IDS_MIGRATION_OFFERED, False):
+        return
+    QueryOp(
+        parent=mw,
+        op=lambda col: find_legacy_notes(col, notetype_manager),
+        success=offer_legacy_notes_migration
+    ).run_in_background()
+
+
+def offer_legacy_notes_migration(result):
+    note_ids, missing = result
+    if not note_ids:
+        if missing == 0:
+            # Nothing to migrate, don't look again
+            mw.col.set_config(WORD_IDS_MIGRATED, True)
+        return
+    mw.col.set_config(WORD_IDS_MIGRATION_OFFERED, True)
+    answer = QMessageBox.question(
+        mw,
+        'Fill Word ID?',
+        f'{len(note_ids)} Sõnaveeb notes created by older versions of the addon have no Word ID, '
+        'so they are not recognized as existing notes of the words. '
+        'Would you like to fill it from their URL now?\n\n'
+        'It can also be done later with "Tools -> Fill Word ID of Sõnaveeb Notes".',
+        QMessageBox.StandardButton.Yes,
+        QMessageBox.StandardButton.No
+    )
+    if answer == QMessageBox.StandardButton.Yes:
+        migrate_legacy_notes()
+
+
+def migrate_legacy_notes():
+    '''Fill Word ID of legacy Sõnaveeb notes in background.'''
+    CollectionOp(
+        parent=mw,
+        op=lambda col: fill_word_ids(col, notetype_manager)
+    ).success(on_legacy_notes_migrated).run_in_background()
+
+
+def on_legacy_notes_migrated(result):
+    tooltip(f'Filled Word ID of {result.count} Sõnaveeb notes')
+
+
+def user_file(name):
+    return os.path.join(os.path.dirname(__file__), 'user_files', name)
+
+
+def create_response_cache(filename='sonaveeb_cache.sqlite', config_prefix='cache'):
+    '''Create persistent cache according to addon config.
+
+    Args:
+        filename: Cache file name in addon user files.
+        config_prefix: Prefix of `_ttl_hours` and `_size_mb` config keys.
+    '''
+    config = mw.addonManager.getConfig(__name__)
+    ttl_hours = config.get(f'{config_prefix}_ttl_hours')
+    size_mb = config.get(f'{config_prefix}_size_mb')
+    if size_mb == 0:
+        return None
+    return ResponseCache(
+        path=user_file(filename),
+        ttl=ttl_hours * 3600 if ttl_hours is not None else None,
+        max_size=size_mb * 1024 * 1024 if size_mb is not None else None,
+    )
+
+
+def create_translator():
+    '''Create Google Translate client according to addon config.'''
+    translator = gtranslate.GoogleTranslate(
+        max_workers=TRANSLATION_WORKERS,
+        policy=create_request_policy(),
+        cache=create_response_cache('gtranslate_cache.sqlite', 'translation_cache'),
+    )
+    seed = mw.addonManager.getConfig(__name__).get('translation_cache_seed')
+    if seed and translator.cache is not None:
+        try:
+            translator.seed_cache(user_file(seed))
+        except (OSError, ValueError, KeyError) as e:
+            print(f'Failed to seed translation cache from {seed}: {e}')
+    return translator
+
+
+def create_request_policy():
+    '''Create rate limiting, retry and circuit breaker policy according to addon config.'''
+    config = mw.addonManager.getConfig(__name__)
+    return RequestPolicy(
+        rate=config.get('requests_per_second'),
+        burst=config.get('requests_burst') or 1,
+        retries=config.get('request_retries') or 0,
+        failure_threshold=config.get('circuit_breaker_failures'),
+        reset_timeout=config.get('circuit_breaker_reset_seconds') or 30,
+    )
+
+
 window = None
-sonaveeb = Sonaveeb()
+sonaveeb = Sonaveeb(
+    cache=create_response_cache(),
+    max_workers=REQUEST_WORKERS,
+    policy=create_request_policy(),
+    hedge_percentile=mw.addonManager.getConfig(__name__).get('hedge_percentile'),
+)
+gtranslate.set_client(create_translator())
 notetype_manager = NoteTypeManager()
+note_index = NoteIndex(notetype_manager)
+note_index.register_hooks()
 
 action = QAction("Sõnaveeb Deck Builder", mw)
 qconnect(action.triggered, open_sonaveeb_dialog)
 mw.form.menuTools.addAction(action)
+refresh_action = QAction("Refresh Sõnaveeb Notes...", mw)
+qconnect(refresh_action.triggered, lambda: refresh_deck_notes(sonaveeb, notetype_manager))
+mw.form.menuTools.addAction(refresh_action)
+migrate_action = QAction("Fill Word ID of Sõnaveeb Notes", mw)
+qconnect(migrate_action.triggered, migrate_legacy_notes)
+mw.form.menuTools.addAction(migrate_action)
 gui_hooks.profile_will_close.append(destroy_sonaveeb_dialog)
+gui_hooks.profile_did_open.append(check_legacy_notes)
@@ -0,0 +1,182 @@
+import os
+import time
+import sqlite3
+import threading
+import typing as tp
+import dataclasses as dc
+from collections import OrderedDict
+
+
+@dc.dataclass
+class CacheStats:
+    hits: int = 0
+    misses: int = 0
+    entries: int = 0
+    size: int = None
+
+
+class ResponseCache:
+    '''Persistent SQLite-backed cache for HTTP responses.
+
+    Entries are keyed by a namespace (e.g. Sõnaveeb mode) and URL, or any
+    other string key (e.g. text of a translation). They expire
+    after `ttl` seconds, and when the total size of cached content exceeds
+    `max_size` bytes the least recently used entries are evicted.
+
+    It is safe to use the cache from multiple threads.
+    '''
+    def __init__(self, path: str, ttl: float = None, max_size: int = None):
+        '''
+        Args:
+            path: SQLite database file path, created if missing.
+            ttl: Time-to-live of an entry in seconds, unlimited if None.
+            max_size: Total size limit of cached content in bytes, unlimited if None.
+        '''
+        if dirname := os.path.dirname(path):
+            os.makedirs(dirname, exist_ok=True)
+        self.ttl = ttl
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._db.execute('PRAGMA journal_mode=WAL')
+        self._db.execute('PRAGMA synchronous=NORMAL')
+        self._db.execute(
+            'CREATE TABLE IF NOT EXISTS responses ('
+            ' namespace TEXT NOT NULL,'
+            ' url TEXT NOT NULL,'
+            ' content TEXT NOT NULL,'
+            ' size INTEGER NOT NULL,'
+            ' created REAL NOT NULL,'
+            ' accessed REAL NOT NULL,'
+            ' PRIMARY KEY (namespace, url))'
+        )
+        self._db.execute('CREATE INDEX IF NOT EXISTS responses_accessed ON responses (accessed)')
+        with self._lock:
+            self._purge_expired()
+            self._size = self._db.execute('SELECT COALESCE(SUM(size), 0) FROM responses').fetchone()[0]
+
+    def get(self, namespace: str, url: str) -> tp.Optional[str]:
+        '''Get cached content, or None if it is missing or expired.'''
+        now = time.time()
+        with self._lock:
+            row = self._db.execute(
+                'SELECT content, size, created FROM responses WHERE namespace = ? AND url = ?',
+                (namespace, url)
+            ).fetchone()
+            if row is not None:
+                content, size, created = row
+                if self.ttl is not None and created + self.ttl < now:
+                    self._delete(namespace, url, size)
+                    row = None
+                else:
+                    self._db.execute(
+                        'UPDATE responses SET accessed = ? WHERE namespace = ? AND url = ?',
+                        (now, namespace, url)
+                    )
+            if row is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            return content
+
+    def put(self, namespace: str, url: str, content: str) -> None:
+        '''Store content, evicting least recently used entries if needed.'''
+        now = time.time()
+        size = len(content.encode())
+        if self.max_size is not None and size > self.max_size:
+            return
+        with self._lock:
+            row = self._db.execute(
+                'SELECT size FROM responses WHERE namespace = ? AND url = ?',
+                (namespace, url)
+            ).fetchone()
+            if row is not None:
+                self._size -= row[0]
+            self._db.execute(
+                'INSERT OR REPLACE INTO responses (namespace, url, content, size, created, accessed)'
+                ' VALUES (?, ?, ?, ?, ?, ?)',
+                (namespace, url, content, size, now, now)
+            )
+            self._size += size
+            self._evict()
+
+    def clear(self) -> None:
+        '''Remove all entries and reset statistics.'''
+        with self._lock:
+            self._db.execute('DELETE FROM responses')
+            self._size = 0
+            self.hits = 0
+            self.misses = 0
+
+    def stats(self) -> CacheStats:
+        '''Get hit and miss counts since opening, and current cache occupancy.'''
+        with self._lock:
+            entries = self._db.execute('SELECT COUNT(*) FROM responses').fetchone()[0]
+            return CacheStats(hits=self.hits, misses=self.misses, entries=entries, size=self._size)
+
+    def close(self) -> None:
+        with self._lock:
+            self._db.close()
+
+    def _delete(self, namespace, url, size):
+        self._db.execute('DELETE FROM responses WHERE namespace = ? AND url = ?', (namespace, url))
+        self._size -= size
+
+    def _purge_expired(self):
+        if self.ttl is not None:
+            self._db.execute('DELETE FROM responses WHERE created < ?', (time.time() - self.ttl,))
+
+    def _evict(self):
+        if self.max_size is None or self._size <= self.max_size:
+            return
+        # Collect least recently used entries until enough space is freed
+        excess = self._size - self.max_size
+        evicted = []
+        for rowid, size in self._db.execute('SELECT rowid, size FROM responses ORDER BY accessed'):
+            evicted.append((rowid,))
+            excess -= size
+            self._size -= size
+            if excess <= 0:
+                break
+        self._db.executemany('DELETE FROM responses WHERE rowid = ?', evicted)
+
+
+class LRUCache:
+    '''Thread-safe in-memory cache evicting the least recently used entries.
+    '''
+    def __init__(self, max_entries: int = 128):
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+
+    def get(self, key: tp.Hashable, default=None):
+        '''Get cached value, or default if it is missing.'''
+        with self._lock:
+            try:
+                value = self._entries[key]
+            except KeyError:
+                self.misses += 1
+                return default
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key: tp.Hashable, value) -> None:
+        '''Store value, evicting the least recently used entry if needed.'''
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> CacheStats:
+        with self._lock:
+            return CacheStats(hits=self.hits, misses=self.misses, entries=len(self._entries))
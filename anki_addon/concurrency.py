@@ -0,0 +1,47 @@
+import threading
+import typing as tp
+from concurrent.futures import Future
+
+
+class SingleFlight:
+    '''Coalescing of concurrent identical calls.
+
+    While a call with some key is in flight, other calls with the same key
+    wait for it and share its result or error, instead of repeating the work.
+    Once the call completes, the next one with that key starts anew.
+
+    It is safe to use from multiple threads.
+    '''
+    def __init__(self):
+        self.calls = 0
+        self.shared = 0
+        self._lock = threading.Lock()
+        self._in_flight: tp.Dict[tp.Hashable, Future] = {}
+
+    def do(self, key: tp.Hashable, func: tp.Callable, *args, **kwargs):
+        '''Call `func(*args, **kwargs)`, unless a call with the key is in flight already.
+
+        Returns:
+            result: Result of the call, shared by all waiting callers.
+        '''
+        with self._lock:
+            future = self._in_flight.get(key)
+            leader = future is None
+            if leader:
+                future = self._in_flight[key] = Future()
+                self.calls += 1
+            else:
+                self.shared += 1
+        if not leader:
+            return future.result()
+        try:
+            result = func(*args, **kwargs)
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        else:
+            future.set_result(result)
+            return result
+        finally:
+            with self._lock:
+                del self._in_flight[key]
@@ -1,4 +1,11 @@
 REQUEST_TIMEOUT = 5
+OPERATION_DEADLINE = 15
 TRANSLATIONS_LIMIT = 3
 EXAMPLES_LIMIT = 3
 LEXEMES_LIMIT = 3
+REQUEST_WORKERS = 4
+TRANSLATION_WORKERS = 8
+# Limits of note refresh requests, which don't depend on the addon config
+REFRESH_REQUESTS_PER_SECOND = 2
+REFRESH_REQUEST_RETRIES = 3
+REFRESH_CIRCUIT_BREAKER_FAILURES = 5
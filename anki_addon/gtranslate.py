@@ -1,50 +1,405 @@
 import os
+import re
 import bs4
+import html as html_lib
+import json
+import asyncio
 import requests
 import typing as tp
-from collections import Counter
+from collections import Counter, defaultdict
+from urllib.parse import quote
+from concurrent.futures import ThreadPoolExecutor, as_completed, TimeoutError as FuturesTimeoutError
 
+from .concurrency import SingleFlight
+from .resilience import RequestPolicy, Deadline, DeadlineExceeded, request_timeout
 
-URL = 'https://translate.google.com/m?tl={target_lang}&sl={source_lang}&q={text}'
 
+BASE_URL = 'https://translate.google.com'
+URL_PATH = '/m?tl={target_lang}&sl={source_lang}&q={text}'
 
-def translate(text: str, target_lang: str = 'en', source_lang: str = 'et', timeout: float = None, debug: bool = False):
-    '''Translate text with Google Translate.'''
-    # GET request to google translate does not requrie authentication
-    url = URL.format(target_lang=target_lang, source_lang=source_lang, text=text)
-    resp = requests.get(url, timeout=timeout)
-    if resp.status_code != 200:
-        raise RuntimeError(f'Request failed: {resp.status_code}')
-    dom = bs4.BeautifulSoup(resp.text, 'html.parser')
+
+class GoogleTranslate:
+    '''Google Translate client.
+
+    Requests share a persistent session, so connections are kept alive and
+    reused instead of paying a TCP and TLS handshake for every translation.
+    It is safe to use the client from multiple threads.
+    '''
+    MAX_WORKERS = 8
+    # Texts of a batch are translated as lines of one text
+    BATCH_DELIMITER = '\n'
+    # Limit of URL-encoded text length of a batch request
+    MAX_BATCH_LENGTH = 2000
+
+    def __init__(self, base_url=None, max_workers=None, policy=None, cache=None):
+        '''
+        Args:
+            base_url: Server to send requests to instead of `BASE_URL`, e.g. a local
+                stand-in for testing.
+            max_workers: Expected number of concurrent requests, `MAX_WORKERS` by default.
+                Connection pool is sized accordingly.
+            policy: Rate limiting, retries and circuit breaking of requests,
+                `resilience.RequestPolicy`. No limits by default.
+            cache: Optional translation cache, e.g. `cache.ResponseCache`. Translations
+                are keyed by source and target languages, and text.
+        '''
+        self.max_workers = max_workers or self.MAX_WORKERS
+        self.session = requests.Session()
+        adapter = requests.adapters.HTTPAdapter(pool_maxsize=self.max_workers)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+        self.base_url = base_url or BASE_URL
+        self.policy = policy or RequestPolicy()
+        self.cache = cache
+        self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix='gtranslate')
+        # Concurrent identical translations are requested and parsed only once
+        self.translation_flights = SingleFlight()
+        self.request_flights = SingleFlight()
+
+    def url(self, text: str, target_lang: str, source_lang: str) -> str:
+        '''Get URL of the translation page.'''
+        return self.base_url + URL_PATH.format(target_lang=target_lang, source_lang=source_lang, text=quote(text))
+
+    def seed_cache(self, path: str) -> int:
+        '''Fill translation cache from JSON file.
+
+        The file contains a list of objects with `text`, `source_lang`,
+        `target_lang` and `translation` keys. Seeded translations replace
+        cached ones.
+
+        Returns:
+            count: Number of seeded translations.
+        '''
+        with open(path, 'r') as file:
+            entries = json.load(file)
+        for entry in entries:
+            self._cache_put(entry['text'], entry['target_lang'], entry['source_lang'], entry['translation'])
+        return len(entries)
+
+    def translate(self, text: str, target_lang: str = 'en', source_lang: str = 'et', timeout: float = None,
+                  debug: bool = False, deadline: Deadline = None):
+        '''Translate text with Google Translate.
+
+        Request timeout is limited by the remaining budget of `deadline`, if any.
+        '''
+        # GET request to google translate does not requrie authentication
+        url = self.url(text, target_lang, source_lang)
+        if debug:
+            return _process_translation(self._request(url, timeout, deadline), text, debug)
+        if (translation := self._cache_get(text, target_lang, source_lang)) is not None:
+            return translation
+        translation = self.translation_flights.do(url, self._fetch_translation, url, text, timeout, deadline)
+        self._cache_put(text, target_lang, source_lang, translation)
+        return translation
+
+    async def translate_async(self, text: str, target_lang: str = 'en', source_lang: str = 'et',
+                              timeout: float = None, debug: bool = False, parse_executor=None,
+                              deadline: Deadline = None):
+        '''Asyncio flavour of `translate`.
+
+        Blocking request runs in the default executor of the event loop,
+        parsing runs in `parse_executor`, the default one if None.
+        '''
+        loop = asyncio.get_running_loop()
+        if not debug and (translation := self._cache_get(text, target_lang, source_lang)) is not None:
+            return translation
+        url = self.url(text, target_lang, source_lang)
+        html = await loop.run_in_executor(None, self.request_flights.do, url, self._request, url, timeout, deadline)
+        translation = await loop.run_in_executor(parse_executor, _process_translation, html, text, debug)
+        self._cache_put(text, target_lang, source_lang, translation)
+        return translation
+
+    def cross_translate(self, sources: tp.Dict[str, tp.List[str]], lang: str, timeout: float = None,
+                        deadline: Deadline = None):
+        '''Find the most suitable common translations for multiple synonyms.
+
+        Translate a list of synonyms from multiple source languages into a single target language,
+        sort translations by frequency of their repetition, and filter the most popular ones.
+
+        Source languages are translated concurrently, at most `max_workers` at once.
+        If some of them fail or don't complete before the deadline, the common
+        translations of the rest are returned.
+
+        Args:
+            source: pairs of source language code and a list of input words in that language.
+            lang: target translation language.
+            timeout: timeout of every request in seconds.
+            deadline: time budget shared by all requests, `resilience.Deadline`.
+
+        Raises:
+            Error of the first failed translation, if all of them fail.
+        '''
+        futures = [
+            self._executor.submit(
+                self.translate, text=', '.join(words), target_lang=lang, source_lang=source_lang,
+                timeout=timeout, deadline=deadline
+            )
+            for source_lang, words in sources.items()
+        ]
+        translations = []
+        errors = []
+        try:
+            for future in as_completed(futures, timeout=deadline.remaining() if deadline else None):
+                try:
+                    translations.append(future.result())
+                except Exception as e:
+                    errors.append(e)
+        except FuturesTimeoutError:
+            errors.append(DeadlineExceeded('Operation timed out'))
+        finally:
+            for future in futures:
+                future.cancel()
+        return _select_partial(translations, errors)
+
+    async def cross_translate_async(self, sources: tp.Dict[str, tp.List[str]], lang: str, timeout: float = None,
+                                    parse_executor=None, deadline: Deadline = None):
+        '''Asyncio flavour of `cross_translate`, translating from all source languages concurrently.'''
+        results = await asyncio.gather(*[
+            self.translate_async(
+                text=', '.join(words), target_lang=lang, source_lang=source_lang,
+                timeout=timeout, parse_executor=parse_executor, deadline=deadline
+            )
+            for source_lang, words in sources.items()
+        ], return_exceptions=True)
+        translations = [r for r in results if not isinstance(r, BaseException)]
+        errors = [r for r in results if isinstance(r, BaseException)]
+        return _select_partial(translations, errors)
+
+    def translate_batch(self, texts: tp.List[str], target_lang: str = 'en', source_lang: str = 'et',
+                        timeout: float = None, deadline: Deadline = None) -> tp.List[tp.Optional[str]]:
+        '''Translate multiple texts in as few requests as possible.
+
+        Texts are packed into requests as lines, and translated lines are split
+        back. If the number of lines doesn't match, texts of that request are
+        translated one by one instead.
+
+        Returns:
+            translations: Translations in the order of texts, None if failed to parse.
+        '''
+        translations = [self._cache_get(text, target_lang, source_lang) for text in texts]
+        missing = [i for i, t in enumerate(translations) if t is None]
+        for chunk in self._batch_chunks([texts[i] for i in missing]):
+            indices = missing[:len(chunk)]
+            missing = missing[len(chunk):]
+            lines = None
+            if len(chunk) > 1:
+                text = self.BATCH_DELIMITER.join(chunk)
+                url = self.url(text, target_lang, source_lang)
+                translation = self.translation_flights.do(url, self._fetch_translation, url, text, timeout, deadline)
+                if translation is not None:
+                    lines = [line.strip() for line in translation.split(self.BATCH_DELIMITER)]
+            if lines is not None and len(lines) == len(chunk):
+                for text, line in zip(chunk, lines):
+                    self._cache_put(text, target_lang, source_lang, line)
+            else:
+                # Delimiter didn't survive translation
+                lines = [
+                    self.translate(text, target_lang, source_lang, timeout=timeout, deadline=deadline)
+                    for text in chunk
+                ]
+            for index, line in zip(indices, lines):
+                translations[index] = line
+        return translations
+
+    def batch_cross_translate(self, items: tp.List[tp.Dict[str, tp.List[str]]], lang: str,
+                              timeout: float = None, deadline: Deadline = None) -> tp.List[tp.Optional[tp.List[str]]]:
+        '''Cross-translate synonyms of many lexemes at once.
+
+        Synonyms of all items are grouped by source language, and every group
+        is translated with `translate_batch`, concurrently. So the number of
+        requests depends on the number of source languages, not items.
+
+        Args:
+            items: Sources of every item, see `cross_translate`.
+            lang, timeout, deadline: See `cross_translate`.
+
+        Returns:
+            translations: Common translations of every item, see `cross_translate`,
+                or None if all its source languages failed.
+        '''
+        groups = defaultdict(list)
+        for index, sources in enumerate(items):
+            for source_lang, words in sources.items():
+                groups[source_lang].append((index, ', '.join(words)))
+        futures = {
+            self._executor.submit(
+                self.translate_batch, [text for _, text in group], lang, source_lang,
+                timeout=timeout, deadline=deadline
+            ): group
+            for source_lang, group in groups.items()
+        }
+        translations = [[] for _ in items]
+        try:
+            for future in as_completed(futures, timeout=deadline.remaining() if deadline else None):
+                group = futures[future]
+                try:
+                    results = future.result()
+                except Exception:
+                    results = [None] * len(group)
+                for (index, _), translation in zip(group, results):
+                    if translation is not None:
+                        translations[index].append(translation)
+        except FuturesTimeoutError:
+            pass
+        finally:
+            for future in futures:
+                future.cancel()
+        return [
+            _select_common(item_translations, len(item_translations)) if item_translations
+            else None if sources else []
+            for sources, item_translations in zip(items, translations)
+        ]
+
+    def _batch_chunks(self, texts):
+        chunk = []
+        length = 0
+        for text in texts:
+            text_length = len(quote(text + self.BATCH_DELIMITER))
+            if chunk and length + text_length > self.MAX_BATCH_LENGTH:
+                yield chunk
+                chunk = []
+                length = 0
+            chunk.append(text)
+            length += text_length
+        if chunk:
+            yield chunk
+
+    def _request(self, url: str, timeout: float = None, deadline: Deadline = None) -> str:
+        # Timeout is evaluated for every attempt, as retries consume the budget
+        send = lambda: self.session.get(url, timeout=request_timeout(timeout, deadline))
+        return self.policy.get(send, deadline=deadline).text
+
+    def _cache_get(self, text, target_lang, source_lang):
+        if self.cache is None:
+            return None
+        return self.cache.get(f'{source_lang}:{target_lang}', text)
+
+    def _cache_put(self, text, target_lang, source_lang, translation):
+        # Failed parsing is not cached, the page might be different next time
+        if self.cache is not None and translation is not None:
+            self.cache.put(f'{source_lang}:{target_lang}', text, translation)
+
+    def _fetch_translation(self, url: str, text: str, timeout: float = None,
+                           deadline: Deadline = None) -> tp.Optional[str]:
+        html = self.request_flights.do(url, self._request, url, timeout, deadline)
+        return _process_translation(html, text)
+
+
+# Default client used by module-level functions
+_client = GoogleTranslate()
+
+
+def get_client() -> GoogleTranslate:
+    return _client
+
+
+def set_client(client: GoogleTranslate) -> None:
+    '''Replace default client, e.g. with one configured differently.'''
+    global _client
+    _client = client
+
+
+def set_base_url(base_url: str) -> None:
+    '''Send requests to a different server, e.g. a local stand-in for testing.'''
+    _client.base_url = base_url
+
+
+def set_request_policy(policy: RequestPolicy) -> None:
+    '''Set rate limiting, retry and circuit breaker policy of the default client.'''
+    _client.policy = policy
+
+
+def request_stats():
+    '''Get counters of requests, see `resilience.RequestPolicy.stats`.'''
+    return _client.policy.stats()
+
+
+def translate(*args, **kwargs):
+    '''See `GoogleTranslate.translate`.'''
+    return _client.translate(*args, **kwargs)
+
+
+async def translate_async(*args, **kwargs):
+    '''See `GoogleTranslate.translate_async`.'''
+    return await _client.translate_async(*args, **kwargs)
+
+
+def cross_translate(*args, **kwargs):
+    '''See `GoogleTranslate.cross_translate`.'''
+    return _client.cross_translate(*args, **kwargs)
+
+
+def translate_batch(*args, **kwargs):
+    '''See `GoogleTranslate.translate_batch`.'''
+    return _client.translate_batch(*args, **kwargs)
+
+
+def batch_cross_translate(*args, **kwargs):
+    '''See `GoogleTranslate.batch_cross_translate`.'''
+    return _client.batch_cross_translate(*args, **kwargs)
+
+
+async def cross_translate_async(*args, **kwargs):
+    '''See `GoogleTranslate.cross_translate_async`.'''
+    return await _client.cross_translate_async(*args, **kwargs)
+
+
+def _process_translation(html: str, text: str, debug: bool = False) -> tp.Optional[str]:
     if debug:
+        dom = bs4.BeautifulSoup(html, 'html.parser')
         open(os.path.join('debug', f'gtranslate_{text}.html'), 'w').write(dom.prettify())
+        return _parse_translation_dom(html)
+    return _parse_translation(html)
+
+
+# Opening tag of the result element, followed by its text up to the next tag
+RESULT_PATTERN = re.compile(
+    r'<div\s[^>]*?\bclass\s*=\s*["\']?(?:[^"\'>]*\s)?result-container[\s"\'>][^>]*?>([^<]*)(</div\s*>)?',
+    re.IGNORECASE,
+)
+
+
+def _parse_translation(html: str) -> tp.Optional[str]:
+    '''Extract translation from Google Translate mobile page.
+
+    The page is scanned for the result element without building a DOM.
+    Unusual markup inside the element is left to `_parse_translation_dom`.
+    '''
+    if 'result-container' not in html:
+        return None
+    match = RESULT_PATTERN.search(html)
+    if match is None or match.group(2) is None:
+        return _parse_translation_dom(html)
+    # An empty element has no string, as with the DOM
+    return html_lib.unescape(match.group(1)) or None
+
+
+def _parse_translation_dom(html: str) -> tp.Optional[str]:
+    '''Extract translation from Google Translate mobile page using a DOM.'''
+    dom = bs4.BeautifulSoup(html, 'html.parser')
     if result := dom.find('div', class_='result-container'):
         result = result.string
     return result
 
 
-def cross_translate(sources: tp.Dict[str, tp.List[str]], lang: str, timeout: float = None):
-    '''Find the most suitable common translations for multiple synonyms.
+def _select_partial(translations: tp.List[tp.Optional[str]], errors: tp.List[BaseException]) -> tp.List[str]:
+    '''Select common translations of the successful source languages.'''
+    # Pages that failed to parse don't contribute to the consensus
+    translations = [t for t in translations if t is not None]
+    if not translations:
+        if errors:
+            raise errors[0]
+        return []
+    return _select_common(translations, len(translations))
 
-    Translate a list of synonyms from multiple source languages into a single target language,
-    sort translations by frequency of their repetition, and filter the most popular ones.
 
-    Args:
-        source: pairs of source language code and a list of input words in that language.
-        lang: target translation language.
-    '''
-    translations = []
-    for source_lang, words in sources.items():
-        text = ', '.join(words)
-        translation = translate(
-            text=text,
-            target_lang=lang,
-            source_lang=source_lang,
-            timeout=timeout
-        )
-        translations += [t.strip() for t in translation.lower().split(',')]
-    counted = Counter(translations)
-    threshold = min(len(sources), max(counted.values()))
+def _select_common(translations: tp.List[str], sources_count: int) -> tp.List[str]:
+    '''Filter the most frequent items of comma-separated translations.'''
+    items = []
+    for translation in translations:
+        items += [t.strip() for t in translation.lower().split(',')]
+    counted = Counter(items)
+    threshold = min(sources_count, max(counted.values()))
     ordered = sorted(counted.items(), key=lambda x: x[1], reverse=True)
     filtered = [k for k, v in ordered if v >= threshold]
     return filtered
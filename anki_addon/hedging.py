@@ -0,0 +1,117 @@
+import math
+import time
+import threading
+import typing as tp
+import dataclasses as dc
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, wait, as_completed
+
+
+class LatencyHistogram:
+    '''Thread-safe window of recently observed latencies.'''
+    def __init__(self, window: int = 200):
+        self._samples = deque(maxlen=window)
+        self._lock = threading.Lock()
+
+    def record(self, latency: float) -> None:
+        with self._lock:
+            self._samples.append(latency)
+
+    def percentile(self, percent: float, min_samples: int = 1) -> tp.Optional[float]:
+        '''Get latency percentile, or None if there are fewer than `min_samples` samples.'''
+        with self._lock:
+            samples = sorted(self._samples)
+        if len(samples) < max(1, min_samples):
+            return None
+        # Nearest-rank method
+        rank = math.ceil(percent / 100 * len(samples))
+        return samples[min(max(rank, 1), len(samples)) - 1]
+
+    def __len__(self):
+        with self._lock:
+            return len(self._samples)
+
+
+@dc.dataclass
+class HedgeStats:
+    calls: int = 0
+    hedged: int = 0
+    backup_wins: int = 0
+
+
+class Hedger:
+    '''Hedging of slow idempotent calls to cut tail latency.
+
+    When a call runs longer than the given percentile of recent latencies
+    of its kind, a duplicate call is made, and whichever completes first
+    wins. The other one is cancelled if it hasn't started yet, otherwise
+    its result is discarded. Latencies are tracked per kind, e.g. endpoint.
+
+    Args:
+        percentile: Latency percentile after which a call is hedged, e.g. 95.
+        min_samples: Minimum number of observed latencies to start hedging.
+        window: Number of recent latencies to track per kind.
+        max_workers: Maximum number of concurrent calls.
+    '''
+    def __init__(self, percentile: float = 95, min_samples: int = 20, window: int = 200, max_workers: int = 8):
+        self.percentile = percentile
+        self.min_samples = min_samples
+        self.window = window
+        self.histograms: tp.Dict[str, LatencyHistogram] = {}
+        self._stats = HedgeStats()
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='hedger')
+
+    def histogram(self, kind: str) -> LatencyHistogram:
+        with self._lock:
+            if kind not in self.histograms:
+                self.histograms[kind] = LatencyHistogram(self.window)
+            return self.histograms[kind]
+
+    def call(self, kind: str, func: tp.Callable):
+        '''Call `func()`, hedging it if it is slow.
+
+        Returns:
+            result: Result of the first successful call.
+
+        Raises:
+            Error of the original call, if both calls fail.
+        '''
+        histogram = self.histogram(kind)
+        threshold = histogram.percentile(self.percentile, self.min_samples)
+        self._count('calls')
+        if threshold is None:
+            # Not enough data yet, call directly to collect it
+            return self._timed(histogram, func)
+        primary = self._executor.submit(self._timed, histogram, func)
+        done, _ = wait([primary], timeout=threshold)
+        if done:
+            return primary.result()
+        self._count('hedged')
+        backup = self._executor.submit(self._timed, histogram, func)
+        for future in as_completed([primary, backup]):
+            if future.exception() is None:
+                (backup if future is primary else primary).cancel()
+                if future is backup:
+                    self._count('backup_wins')
+                return future.result()
+        return primary.result()
+
+    def stats(self) -> HedgeStats:
+        with self._lock:
+            return dc.replace(self._stats)
+
+    def close(self) -> None:
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+    @staticmethod
+    def _timed(histogram, func):
+        start = time.monotonic()
+        result = func()
+        # Only successful calls are representative of normal latency
+        histogram.record(time.monotonic() - start)
+        return result
+
+    def _count(self, name):
+        with self._lock:
+            setattr(self._stats, name, getattr(self._stats, name) + 1)
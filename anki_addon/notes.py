@@ -0,0 +1,490 @@
+import re
+import time
+import threading
+import functools
+import typing as tp
+import dataclasses as dc
+from collections import defaultdict
+
+from anki import hooks
+from anki.collection import Collection, OpChangesWithCount, AddNoteRequest
+from anki.notes import Note, NoteId
+from aqt import gui_hooks
+from aqt.editor import Editor
+from aqt.reviewer import Reviewer
+
+from .notetypes import NoteTypeManager
+from .sonaveeb import WordInfo, LexemeInfo
+
+
+FIELD_SEPARATOR = '\x1f'
+# Collection config key, set once no notes lack Word ID
+WORD_IDS_MIGRATED = 'sonaveeb_word_ids_migrated'
+# Collection config key, set once the user was offered to fill Word IDs
+WORD_IDS_MIGRATION_OFFERED = 'sonaveeb_word_ids_migration_offered'
+# Word ID in Sõnaveeb URLs, e.g. `.../search/unif/dlall/dsall/tee/123/1` or `.../worddetails/unif/123`
+URL_WORD_ID_PATTERNS = [
+    re.compile(r'/search/.+/(\d+)/\d+/?$'),
+    re.compile(r'/worddetails/\w+/(\d+)/?$'),
+]
+MIGRATION_BATCH_SIZE = 500
+ADD_BATCH_SIZE = 100
+
+
+@dc.dataclass
+class IndexedNote:
+    '''Snapshot of a note in the index.
+
+    Provides the same field access as `anki.notes.Note`.
+    '''
+    id: NoteId
+    mid: int
+    fields: tp.Dict[str, str]
+    decks: tp.Set[int]
+    tags: tp.Set[str] = dc.field(default_factory=set)
+
+    def keys(self) -> tp.List[str]:
+        return list(self.fields.keys())
+
+    def __getitem__(self, key: str) -> str:
+        return self.fields[key]
+
+    def __contains__(self, key: str) -> bool:
+        return key in self.fields
+
+
+class AddNotesError(RuntimeError):
+    '''Adding notes failed part way, after some of them were added.'''
+    def __init__(self, added: int, total: int, error: Exception):
+        super().__init__(f'Added {added} of {total} notes: {error}')
+        self.added = added
+        self.total = total
+
+
+@dc.dataclass
+class NotePayload:
+    '''Content of a note to be added.'''
+    fields: tp.Dict[str, str]
+    tags: tp.List[str]
+    deck_id: int
+
+
+def note_content(
+        word_info: WordInfo,
+        lexeme: LexemeInfo,
+        translations: tp.List[str],
+        examples_limit: int = None) -> tp.Tuple[tp.Dict[str, str], tp.List[str]]:
+    '''Derive fields and tags of a note for a lexeme of the word.
+
+    Returns:
+        fields: Field values by name.
+        tags: Tags to add.
+    '''
+    fields = {
+        'Word ID': word_info.word_id,
+        'Morphology': word_info.short_record(),
+        'URL': word_info.url,
+        'Translation': ', '.join(translations),
+        'Definition': lexeme.definition or '',
+        'Examples': '<br>'.join(lexeme.examples[:examples_limit]),
+        'Rection': ', '.join(lexeme.rection)
+    }
+    tags = []
+    if word_info.word_class is not None:
+        tags.append(word_info.word_class)
+    if lexeme.level:
+        tags.append(lexeme.level)
+    return fields, tags
+
+
+def fill_note(note: Note, fields: tp.Dict[str, str], tags: tp.List[str]):
+    '''Fill note with field values and add tags.'''
+    for key, value in fields.items():
+        note[key] = value
+    for tag in tags:
+        note.add_tag(tag)
+
+
+def find_deck_notes(col: Collection, notetype_manager: NoteTypeManager, deck_id: int) -> tp.List[IndexedNote]:
+    '''Find notes of valid Sõnaveeb note types with Word ID in a deck, including its subdecks.
+
+    Returns:
+        notes: Notes ordered by ID, i.e. creation time.
+    '''
+    notetypes = {nt['id']: [f['name'] for f in nt['flds']] for nt in notetype_manager.get_valid_notetypes()}
+    if not notetypes:
+        return []
+    mids = ', '.join(str(mid) for mid in notetypes)
+    dids = ', '.join(str(did) for did in col.decks.deck_and_child_ids(deck_id))
+    rows = col.db.all(
+        'select distinct n.id, n.mid, n.flds, n.tags from notes n join cards c on c.nid = n.id'
+        f' where n.mid in ({mids}) and (c.did in ({dids}) or c.odid in ({dids})) order by n.id'
+    )
+    notes = []
+    for note_id, mid, flds, tags in rows:
+        fields = dict(zip(notetypes[mid], flds.split(FIELD_SEPARATOR)))
+        if fields.get('Word ID'):
+            notes.append(IndexedNote(note_id, mid, fields, {deck_id}, set(tags.split())))
+    return notes
+
+
+def update_notes(col: Collection, updates: tp.List[tp.Tuple[NoteId, tp.Dict[str, str], tp.List[str]]]) -> OpChangesWithCount:
+    '''Update fields and add tags of multiple notes in one request, as a collection operation.
+
+    Args:
+        col: Anki collection.
+        updates: Note ID, field values and tags of every note.
+
+    Returns:
+        changes: Collection changes with the number of updated notes.
+    '''
+    notes = []
+    for note_id, fields, tags in updates:
+        note = col.get_note(note_id)
+        fill_note(note, fields, tags)
+        notes.append(note)
+    if not notes:
+        return OpChangesWithCount(count=0)
+    changes = col.update_notes(notes)
+    return OpChangesWithCount(changes=changes, count=len(notes))
+
+
+def add_notes(
+        col: Collection,
+        notetype: dict,
+        payloads: tp.List[NotePayload],
+        batch_size: int = ADD_BATCH_SIZE,
+        progress: tp.Callable[[int, int], None] = None) -> OpChangesWithCount:
+    '''Add multiple notes, as a collection operation.
+
+    Notes are added in batches, merged into one undo step. If a batch fails,
+    the notes added before it are kept, and can be undone in one step too.
+
+    Args:
+        col: Anki collection.
+        notetype: Note type of the notes.
+        payloads: Contents of the notes.
+        batch_size: Number of notes to add per request.
+        progress: Function called with the numbers of added and all notes after every batch.
+
+    Returns:
+        changes: Collection changes with the number of added notes.
+
+    Raises:
+        AddNotesError: A batch failed, with the number of notes added before it.
+    '''
+    if not payloads:
+        return OpChangesWithCount(count=0)
+    undo_position = col.add_custom_undo_entry(f'Add {len(payloads)} Sõnaveeb Notes')
+    added = 0
+    try:
+        for start in range(0, len(payloads), batch_size):
+            requests = []
+            for payload in payloads[start:start + batch_size]:
+                note = col.new_note(notetype)
+                fill_note(note, payload.fields, payload.tags)
+                requests.append(AddNoteRequest(note=note, deck_id=payload.deck_id))
+            col.add_notes(requests)
+            added += len(requests)
+            if progress is not None:
+                progress(added, len(payloads))
+    except Exception as e:
+        raise AddNotesError(added, len(payloads), e) from e
+    finally:
+        changes = col.merge_undo_entries(undo_position)
+    return OpChangesWithCount(changes=changes, count=added)
+
+
+def word_id_from_url(url: str) -> tp.Optional[str]:
+    '''Derive word ID from Sõnaveeb URL, or None if it doesn't contain one.'''
+    for pattern in URL_WORD_ID_PATTERNS:
+        if match := pattern.search(url):
+            return match.group(1)
+    return None
+
+
+def find_legacy_notes(col: Collection, notetype_manager: NoteTypeManager) -> tp.Tuple[tp.List[NoteId], int]:
+    '''Find Sõnaveeb notes with empty Word ID.
+
+    Returns:
+        note_ids: Notes with empty Word ID.
+        missing: Number of notes whose note type has no Word ID field yet.
+    '''
+    note_ids = []
+    missing = 0
+    for notetype in notetype_manager.get_intended_notetypes():
+        names = [f['name'] for f in notetype['flds']]
+        rows = col.db.all('select id, flds from notes where mid = ?', notetype['id'])
+        if 'Word ID' not in names:
+            missing += len(rows)
+            continue
+        index = names.index('Word ID')
+        note_ids += [note_id for note_id, flds in rows if not flds.split(FIELD_SEPARATOR)[index].strip()]
+    return note_ids, missing
+
+
+def fill_word_ids(
+        col: Collection,
+        notetype_manager: NoteTypeManager,
+        batch_size: int = MIGRATION_BATCH_SIZE) -> OpChangesWithCount:
+    '''Fill empty Word ID of legacy notes from their URL, as a collection operation.
+
+    Notes are updated in batches, merged into one undo step. The migration is
+    resumable, as it only picks notes that still lack Word ID. Once there are
+    none, the collection is marked as migrated, see `is_migrated`.
+
+    Returns:
+        changes: Collection changes with the number of updated notes.
+    '''
+    note_ids, unresolved = find_legacy_notes(col, notetype_manager)
+    if not note_ids:
+        if unresolved == 0:
+            col.set_config(WORD_IDS_MIGRATED, True)
+        return OpChangesWithCount(count=0)
+    undo_position = col.add_custom_undo_entry('Fill Sõnaveeb Word IDs')
+    updated = 0
+    for start in range(0, len(note_ids), batch_size):
+        notes = []
+        for note_id in note_ids[start:start + batch_size]:
+            note = col.get_note(note_id)
+            if word_id := word_id_from_url(note['URL']):
+                note['Word ID'] = word_id
+                notes.append(note)
+            else:
+                unresolved += 1
+        if notes:
+            col.update_notes(notes)
+            updated += len(notes)
+    if unresolved == 0:
+        col.set_config(WORD_IDS_MIGRATED, True)
+    changes = col.merge_undo_entries(undo_position)
+    return OpChangesWithCount(changes=changes, count=updated)
+
+
+def is_migrated(col: Collection) -> bool:
+    '''Check if all Sõnaveeb notes of the collection have Word ID.'''
+    return bool(col.get_config(WORD_IDS_MIGRATED, False))
+
+
+@dc.dataclass
+class NoteIndexStats:
+    notes: int = 0
+    builds: int = 0
+    build_time: float = 0.0
+
+
+class NoteIndex:
+    '''In-memory index of Sõnaveeb notes by Word ID and deck.
+
+    The index is built lazily on the first lookup, and then kept current
+    with note add, update and delete hooks. Changes it can't follow note
+    by note, such as sync, undo, or bulk operations in the browser, make it
+    rebuild on the next lookup. Notes of all note types intended for this
+    addon are indexed, including outdated ones. Legacy notes without a Word
+    ID are indexed by URL, unless the collection is migrated (see `fill_word_ids`).
+
+    It is meant to be used on the main thread. Note hooks also fire on
+    background threads of collection operations, so they only queue the
+    changes, and the queue is applied on the main thread by the next lookup.
+    '''
+    def __init__(self, notetype_manager: NoteTypeManager):
+        self.notetype_manager = notetype_manager
+        self._col = None
+        self._notes: tp.Dict[NoteId, IndexedNote] = {}
+        self._by_word_id: tp.Dict[tp.Tuple[str, int], tp.Set[NoteId]] = defaultdict(set)
+        self._by_url: tp.Dict[tp.Tuple[str, int], tp.Set[NoteId]] = defaultdict(set)
+        # Field names by indexed note type ID
+        self._notetypes: tp.Dict[int, tp.List[str]] = {}
+        self._url_fallback = True
+        # Changes of notes queued by hooks, guarded by the lock
+        self._lock = threading.Lock()
+        self._pending: tp.List[tp.Callable[[], None]] = []
+        self._stats = NoteIndexStats()
+
+    def register_hooks(self):
+        hooks.note_will_be_added.append(self._on_note_will_be_added)
+        hooks.note_will_flush.append(self._on_note_will_flush)
+        hooks.notes_will_be_deleted.append(self._on_notes_will_be_deleted)
+        gui_hooks.operation_did_execute.append(self._on_operation_did_execute)
+        gui_hooks.state_did_undo.append(self._on_changed)
+        gui_hooks.sync_did_finish.append(self.invalidate)
+        gui_hooks.collection_did_load.append(self._on_changed)
+        gui_hooks.profile_will_close.append(self.invalidate)
+
+    def invalidate(self):
+        '''Rebuild the index on the next lookup.'''
+        with self._lock:
+            self._col = None
+            self._pending = []
+        self._notes = {}
+        self._by_word_id.clear()
+        self._by_url.clear()
+        self._notetypes = {}
+
+    def build(self, col: Collection):
+        '''Build the index of the collection from scratch.'''
+        start = time.perf_counter()
+        self.invalidate()
+        # Changes from now on are queued, and applied over the notes read below
+        with self._lock:
+            self._col = col
+        self._notetypes = {
+            nt['id']: [f['name'] for f in nt['flds']]
+            for nt in self.notetype_manager.get_intended_notetypes()
+        }
+        self._url_fallback = not is_migrated(col)
+        if self._notetypes:
+            mids = ', '.join(str(mid) for mid in self._notetypes)
+            # Cards in filtered decks also belong to their original decks
+            rows = col.db.all(
+                'select n.id, n.mid, n.flds, c.did, c.odid from notes n'
+                f' join cards c on c.nid = n.id where n.mid in ({mids})'
+            )
+            for note_id, mid, flds, did, odid in rows:
+                note = self._notes.get(note_id)
+                if note is None:
+                    fields = dict(zip(self._notetypes[mid], flds.split(FIELD_SEPARATOR)))
+                    note = self._notes[note_id] = IndexedNote(note_id, mid, fields, set())
+                note.decks.add(did)
+                if odid:
+                    note.decks.add(odid)
+            for note in self._notes.values():
+                self._link(note)
+        self._stats.builds += 1
+        self._stats.build_time = time.perf_counter() - start
+
+    def find(self, col: Collection, deck_id: int, words: tp.Iterable[tp.Tuple[str, str]]) -> tp.Dict[str, IndexedNote]:
+        '''Find existing notes of multiple words in a deck.
+
+        Notes are matched by Word ID, or by URL for legacy notes without it.
+
+        Args:
+            col: Anki collection.
+            deck_id: Deck to search in, including its subdecks.
+            words: Pairs of word ID and Sõnaveeb URL.
+
+        Returns:
+            notes: Note by word ID, for the words that have a note.
+        '''
+        self._ensure_current(col)
+        decks = col.decks.deck_and_child_ids(deck_id)
+        found = {}
+        for word_id, url in words:
+            note_ids = set()
+            for deck in decks:
+                note_ids |= self._by_word_id.get((str(word_id), deck), set())
+            if not note_ids:
+                # Fallback to legacy notes
+                for deck in decks:
+                    note_ids |= self._by_url.get((url, deck), set())
+            if note_ids:
+                found[word_id] = self._notes[min(note_ids)]
+        return found
+
+    def stats(self) -> NoteIndexStats:
+        stats = dc.replace(self._stats)
+        stats.notes = len(self._notes)
+        return stats
+
+    def __len__(self):
+        return len(self._notes)
+
+    def _ensure_current(self, col):
+        if self._col is not col:
+            self.build(col)
+        with self._lock:
+            pending, self._pending = self._pending, []
+        for apply in pending:
+            apply()
+
+    def _queue(self, col, apply):
+        with self._lock:
+            if self._col is not None and (col is None or self._col is col):
+                self._pending.append(apply)
+
+    def _is_indexed(self, mid):
+        if mid not in self._notetypes:
+            # Note types created after the index was built
+            notetype = self._col.models.get(mid)
+            if notetype is None or not self.notetype_manager.is_notetype_intended(notetype):
+                return False
+            self._notetypes[mid] = [f['name'] for f in notetype['flds']]
+        return True
+
+    def _update(self, note_id, mid, fields, decks=None):
+        '''Add or replace the note in the index, or remove it if its note type isn't indexed.'''
+        if not self._is_indexed(mid):
+            # Note type might have changed to an unrelated one
+            self._remove(note_id)
+            return
+        old = self._notes.get(note_id)
+        if old is not None:
+            self._unlink(old)
+            decks = decks or old.decks
+        elif decks is None:
+            decks = set(self._col.db.list(
+                'select distinct did from cards where nid = ?'
+                ' union select distinct odid from cards where nid = ? and odid != 0',
+                note_id, note_id
+            ))
+        indexed = IndexedNote(note_id, mid, fields, set(decks))
+        self._notes[note_id] = indexed
+        self._link(indexed)
+
+    def _update_added(self, note, deck_id):
+        # Note ID is assigned once it is added
+        if note.id:
+            self._update(note.id, note.mid, dict(note.items()), {deck_id})
+
+    def _remove_all(self, note_ids):
+        for note_id in note_ids:
+            self._remove(note_id)
+
+    def _remove(self, note_id):
+        note = self._notes.pop(note_id, None)
+        if note is not None:
+            self._unlink(note)
+
+    def _keys(self, note):
+        '''Get the index and its keys that the note is found by.'''
+        if word_id := note.fields.get('Word ID'):
+            return self._by_word_id, [(word_id, deck) for deck in note.decks]
+        if self._url_fallback and (url := note.fields.get('URL')):
+            return self._by_url, [(url, deck) for deck in note.decks]
+        return None, []
+
+    def _link(self, note):
+        index, keys = self._keys(note)
+        for key in keys:
+            index[key].add(note.id)
+
+    def _unlink(self, note):
+        index, keys = self._keys(note)
+        for key in keys:
+            index[key].discard(note.id)
+            if not index[key]:
+                del index[key]
+
+    # Hooks. Note hooks may fire on background threads.
+
+    def _on_note_will_be_added(self, col, note, deck_id):
+        self._queue(col, functools.partial(self._update_added, note, deck_id))
+
+    def _on_note_will_flush(self, note):
+        if note.id:
+            # Snapshot the fields, as the note might change before the update is applied
+            update = functools.partial(self._update, note.id, note.mid, dict(note.items()))
+            self._queue(None, update)
+
+    def _on_notes_will_be_deleted(self, col, note_ids):
+        self._queue(col, functools.partial(self._remove_all, list(note_ids)))
+
+    def _on_operation_did_execute(self, changes, handler):
+        # Reviews don't change notes, and editor saves are followed by `note_will_flush`
+        if isinstance(handler, (Reviewer, Editor)):
+            return
+        if changes.note_text or changes.card or changes.deck or changes.notetype:
+            self.invalidate()
+
+    def _on_changed(self, *_args):
+        self.invalidate()
@@ -0,0 +1,152 @@
+'''
+Refresh of existing Sõnaveeb notes against the dictionary
+'''
+
+import typing as tp
+import dataclasses as dc
+
+from .sonaveeb import Sonaveeb, SonaveebMode, WordInfo, WordReference, LexemeInfo
+from .notes import IndexedNote, note_content
+
+
+# Fields that are compared to choose the lexeme a note was created from
+LEXEME_FIELDS = ['Definition', 'Examples', 'Rection']
+# Number of matching fields that identifies the lexeme, unless the definition matches
+MIN_MATCHING_FIELDS = 2
+
+
+@dc.dataclass
+class RefreshStats:
+    checked: int = 0
+    changed: int = 0
+    # Notes whose lexeme couldn't be recognized in the current word info
+    unmatched: int = 0
+    # Note ID and error of every note whose word couldn't be fetched
+    failures: tp.List[tp.Tuple[int, str]] = dc.field(default_factory=list)
+
+    @property
+    def failed(self) -> int:
+        return len(self.failures)
+
+
+def word_reference(note: IndexedNote) -> WordReference:
+    '''Get reference to the word of a note, in the mode it was created in.'''
+    url = note['URL']
+    mode = SonaveebMode.Lite if '/lite/' in url else SonaveebMode.Advanced
+    return WordReference(word_id=note['Word ID'], url=url, lang='et', mode=mode)
+
+
+def select_lexeme(note: IndexedNote, word_info: WordInfo, examples_limit: int = None) -> tp.Optional[LexemeInfo]:
+    '''Find the lexeme that the note was created from.
+
+    Some fields of the lexeme might have been corrected in the dictionary
+    since, so the lexeme is recognized by its definition, or by at least
+    `MIN_MATCHING_FIELDS` matching fields. If several lexemes match equally
+    well, none is selected, as a common rection or example is not enough
+    to tell senses apart. The only lexeme of a word is always selected.
+
+    Returns:
+        lexeme: LexemeInfo object, or None if no lexeme clearly matches.
+    '''
+    if len(word_info.lexemes) == 1:
+        return word_info.lexemes[0]
+    scores = []
+    for lexeme in word_info.lexemes:
+        fields, _ = note_content(word_info, lexeme, [], examples_limit)
+        matching = [k for k in LEXEME_FIELDS if note[k] and note[k] == fields[k]]
+        if 'Definition' in matching or len(matching) >= MIN_MATCHING_FIELDS:
+            scores.append((('Definition' in matching, len(matching)), lexeme))
+    if not scores:
+        return None
+    scores.sort(key=lambda item: item[0], reverse=True)
+    if len(scores) > 1 and scores[0][0] == scores[1][0]:
+        return None
+    return scores[0][1]
+
+
+def refreshed_content(
+        note: IndexedNote,
+        word_info: WordInfo,
+        examples_limit: int = None) -> tp.Optional[tp.Tuple[tp.Dict[str, str], tp.List[str]]]:
+    '''Derive up-to-date fields and tags of a note.
+
+    Translation is kept as is, since it might have been chosen or translated
+    for the user's language when the note was created.
+
+    Returns: tuple, or None if the lexeme of the note is not clearly recognized
+        fields: Field values by name.
+        tags: Tags to add.
+    '''
+    lexeme = select_lexeme(note, word_info, examples_limit)
+    if lexeme is None:
+        return None
+    fields, tags = note_content(word_info, lexeme, [], examples_limit)
+    fields['Word ID'] = str(fields['Word ID'])
+    fields['Translation'] = note['Translation']
+    return fields, tags
+
+
+def diff_fields(note: IndexedNote, fields: tp.Dict[str, str]) -> tp.Dict[str, str]:
+    '''Get fields whose values differ from the note.'''
+    return {k: v for k, v in fields.items() if note[k] != v}
+
+
+def refresh_notes(
+        sonaveeb: Sonaveeb,
+        notes: tp.List[IndexedNote],
+        max_workers: int = None,
+        timeout: float = None,
+        lexemes_limit: int = None,
+        examples_limit: int = None,
+        stats: RefreshStats = None) -> tp.List[tp.Tuple[int, tp.Dict[str, str], tp.List[str]]]:
+    '''Re-fetch words of the notes and find the notes that changed.
+
+    Words are requested concurrently, within the rate limits of the client.
+    Cached pages are bypassed, so that the notes are compared with the current
+    dictionary, and the caches are updated with the fetched pages. All lexemes
+    are parsed by default, since the lexeme of a note might have moved.
+
+    Args:
+        sonaveeb: Sonaveeb client.
+        notes: Notes to refresh.
+        max_workers: Maximum number of concurrent requests.
+        timeout, lexemes_limit, examples_limit: See `Sonaveeb.get_word_info_by_reference`.
+            `examples_limit` must be the one the notes were created with.
+        stats: RefreshStats to count the notes and record failures in.
+
+    Returns:
+        updates: Note ID, changed field values and tags of every changed note, see `notes.update_notes`.
+    '''
+    stats = stats or RefreshStats()
+    references = [word_reference(note) for note in notes]
+    updates = []
+    completed = sonaveeb.iter_word_infos(
+        references,
+        max_workers=max_workers,
+        timeout=timeout,
+        lexemes_limit=lexemes_limit,
+        examples_limit=examples_limit,
+        use_cache=False,
+    )
+    for index, future in completed:
+        note = notes[index]
+        stats.checked += 1
+        try:
+            word_info = future.result()
+        except Exception as e:
+            stats.failures.append((note.id, str(e)))
+            continue
+        content = refreshed_content(note, word_info, examples_limit) if word_info is not None else None
+        if content is None:
+            stats.unmatched += 1
+            continue
+        fields, tags = content
+        changed = diff_fields(note, fields)
+        # Tags are only added, so only the missing ones are a change. Tags are case-insensitive.
+        if changed or {t.lower() for t in tags} - {t.lower() for t in note.tags}:
+            stats.changed += 1
+            updates.append((note.id, changed, tags))
+    # Keep the order of the notes
+    order = {note.id: i for i, note in enumerate(notes)}
+    updates.sort(key=lambda update: order[update[0]])
+    return updates
@@ -0,0 +1,276 @@
+import time
+import random
+import threading
+import typing as tp
+import dataclasses as dc
+
+import requests
+
+
+class RequestError(RuntimeError):
+    '''Request failed with a non-200 HTTP status.'''
+    def __init__(self, status: int):
+        super().__init__(f'Request failed: {status}')
+        self.status = status
+
+
+class CircuitOpenError(RuntimeError):
+    '''Request was not sent, as the service failed repeatedly and is considered down.'''
+
+
+class DeadlineExceeded(RuntimeError):
+    '''Operation ran out of its time budget.'''
+
+
+class Deadline:
+    '''Time budget of an operation spanning multiple requests.
+
+    Every request of the operation gets the remaining budget as its timeout,
+    so that the whole operation completes in time.
+
+    Args:
+        budget: Time budget in seconds from now, unlimited if None.
+    '''
+    def __init__(self, budget: float = None):
+        self.expires = time.monotonic() + budget if budget is not None else None
+
+    def remaining(self) -> tp.Optional[float]:
+        '''Get remaining time in seconds, None if unlimited.'''
+        if self.expires is None:
+            return None
+        return max(0.0, self.expires - time.monotonic())
+
+    @property
+    def expired(self) -> bool:
+        return self.expires is not None and time.monotonic() >= self.expires
+
+    def timeout(self, timeout: float = None) -> tp.Optional[float]:
+        '''Get timeout for the next request, limited by the remaining budget.
+
+        Args:
+            timeout: Own timeout of the request, unlimited if None.
+
+        Raises:
+            DeadlineExceeded: No time is left.
+        '''
+        remaining = self.remaining()
+        if remaining is None:
+            return timeout
+        if remaining <= 0:
+            raise DeadlineExceeded('Operation timed out')
+        return remaining if timeout is None else min(timeout, remaining)
+
+
+def request_timeout(timeout: float = None, deadline: Deadline = None) -> tp.Optional[float]:
+    '''Get timeout for the next request, limited by the deadline if there is one.'''
+    return deadline.timeout(timeout) if deadline is not None else timeout
+
+
+@dc.dataclass
+class RequestStats:
+    requests: int = 0
+    throttled: int = 0
+    retried: int = 0
+    failed: int = 0
+    rejected: int = 0
+
+
+class TokenBucket:
+    '''Thread-safe rate limiter.
+
+    Allows bursts of up to `burst` calls, and `rate` calls per second on average.
+    '''
+    def __init__(self, rate: float, burst: int = 1):
+        self.rate = rate
+        self.burst = burst
+        self._tokens = float(burst)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self) -> float:
+        '''Take a token, waiting for it if needed.
+
+        Returns:
+            wait: Time waited in seconds.
+        '''
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            # Reserve the token in advance, so that waiting callers queue up
+            self._tokens -= 1
+            wait = -self._tokens / self.rate if self._tokens < 0 else 0.0
+        if wait > 0:
+            time.sleep(wait)
+        return wait
+
+
+class CircuitBreaker:
+    '''Thread-safe circuit breaker.
+
+    After `failure_threshold` consecutive failures the circuit opens and calls
+    are rejected for `reset_timeout` seconds. Then a single trial call is let
+    through: its success closes the circuit, and its failure opens it again.
+    '''
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._failures = 0
+        self._opened = None
+        self._trial = False
+        self._lock = threading.Lock()
+
+    @property
+    def is_open(self) -> bool:
+        return self._opened is not None
+
+    def check(self) -> bool:
+        '''Raise CircuitOpenError if a call is not allowed now.
+
+        Returns:
+            trial: Whether the call is the trial one. Its outcome must be
+                recorded, or the trial released with `release_trial`.
+        '''
+        with self._lock:
+            if self._opened is None:
+                return False
+            if self._trial or time.monotonic() < self._opened + self.reset_timeout:
+                raise CircuitOpenError('Service is unavailable, try again later')
+            self._trial = True
+            return True
+
+    def release_trial(self) -> None:
+        '''Let another call be the trial one, as the trial call ended without an outcome.'''
+        with self._lock:
+            self._trial = False
+
+    def record_success(self) -> None:
+        with self._lock:
+            self._failures = 0
+            self._opened = None
+            self._trial = False
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self._failures += 1
+            if self._trial or self._failures >= self.failure_threshold:
+                self._opened = time.monotonic()
+                self._trial = False
+
+
+class RequestPolicy:
+    '''Rate limiting, retries and circuit breaking of idempotent GET requests.
+
+    Requests failed with a transient HTTP status or a connection error are
+    retried with jittered exponential backoff. All limits are disabled by
+    default. It is safe to share a policy between threads.
+
+    Args:
+        rate: Maximum average number of requests per second, unlimited if None.
+        burst: Maximum number of requests sent at once within the rate.
+        retries: Maximum number of retries of a failed request.
+        backoff: Delay before the first retry in seconds, doubled for every next one.
+        max_backoff: Maximum delay before a retry in seconds.
+        failure_threshold: Number of consecutive failures after which requests
+            fail fast, never if None.
+        reset_timeout: Time in seconds after which a request is sent again
+            when failing fast.
+    '''
+    RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+    def __init__(self, rate: float = None, burst: int = 1, retries: int = 0,
+                 backoff: float = 0.5, max_backoff: float = 8,
+                 failure_threshold: int = None, reset_timeout: float = 30):
+        self.limiter = TokenBucket(rate, burst) if rate else None
+        self.breaker = CircuitBreaker(failure_threshold, reset_timeout) if failure_threshold else None
+        self.retries = retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self._stats = RequestStats()
+        self._lock = threading.Lock()
+
+    def get(self, send: tp.Callable[[], requests.Response], deadline: Deadline = None) -> requests.Response:
+        '''Send request according to the policy.
+
+        Args:
+            send: Function sending the request.
+            deadline: Time budget, requests are not retried beyond it.
+
+        Returns:
+            response: Successful response.
+
+        Raises:
+            RequestError: Request failed with a non-200 status.
+            CircuitOpenError: Service is considered down.
+            DeadlineExceeded: No time is left for the request.
+            requests.RequestException: Request failed with a connection error.
+        '''
+        for attempt in range(self.retries + 1):
+            # A request without time left must not take the trial of an open circuit
+            request_timeout(None, deadline)
+            trial = self._check_circuit()
+            if self.limiter is not None and self.limiter.acquire() > 0:
+                self._count('throttled')
+            self._count('requests')
+            resp = None
+            try:
+                resp = send()
+            except (requests.ConnectionError, requests.Timeout) as e:
+                error = e
+            except requests.RequestException:
+                # Other failures, e.g. broken responses or redirect loops, are not retried
+                if self.breaker is not None:
+                    self.breaker.record_failure()
+                self._count('failed')
+                raise
+            except BaseException:
+                # The request didn't complete, e.g. ran out of time, so the service state is unknown
+                if trial:
+                    self.breaker.release_trial()
+                raise
+            else:
+                if resp.status_code == 200:
+                    if self.breaker is not None:
+                        self.breaker.record_success()
+                    return resp
+                error = RequestError(resp.status_code)
+            # Only server-side failures count, e.g. not found word means the service is up
+            transient = resp is None or resp.status_code in self.RETRY_STATUSES
+            if self.breaker is not None:
+                if transient:
+                    self.breaker.record_failure()
+                else:
+                    self.breaker.record_success()
+            delay = self._retry_delay(attempt, resp)
+            remaining = deadline.remaining() if deadline is not None else None
+            out_of_time = remaining is not None and remaining <= delay
+            if not transient or attempt == self.retries or out_of_time:
+                self._count('failed')
+                raise error
+            self._count('retried')
+            time.sleep(delay)
+
+    def stats(self) -> RequestStats:
+        '''Get counters of requests since creation.'''
+        with self._lock:
+            return dc.replace(self._stats)
+
+    def _check_circuit(self):
+        if self.breaker is None:
+            return False
+        try:
+            return self.breaker.check()
+        except CircuitOpenError:
+            self._count('rejected')
+            raise
+
+    def _retry_delay(self, attempt, resp):
+        # Full jitter spreads retries of concurrent requests apart
+        delay = random.uniform(0, min(self.max_backoff, self.backoff * 2 ** attempt))
+        if resp is not None and (retry_after := resp.headers.get('Retry-After', '')).isdigit():
+            delay = max(delay, min(self.max_backoff, int(retry_after)))
+        return delay
+
+    def _count(self, name):
+        with self._lock:
+            setattr(self._stats, name, getattr(self._stats, name) + 1)
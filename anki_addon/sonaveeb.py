@@ -1,12 +1,38 @@
 import os
 import re
+import copy
 import enum
+import json
+import asyncio
+import threading
 import typing as tp
 import dataclasses as dc
+from concurrent.futures import ThreadPoolExecutor, Future, as_completed
 
 import requests
 import bs4
 
+from .cache import LRUCache
+from .concurrency import SingleFlight
+from .resilience import RequestPolicy, Deadline, request_timeout
+from .hedging import Hedger
+
+
+# BeautifulSoup tree builders in the order of preference. Compiled lxml is
+# several times faster, but it is not bundled with Anki, so it is used only
+# if installed. The parsing code is the same for all of them.
+HTML_PARSERS = ['lxml', 'html.parser']
+
+
+LEXEME_SECTION_ID = re.compile('^lexeme-section')
+
+
+def default_html_parser() -> str:
+    '''Get the fastest available HTML parser.'''
+    for name in HTML_PARSERS:
+        if bs4.builder.builder_registry.lookup(name) is not None:
+            return name
+
 
 class SonaveebMode(enum.Enum):
     Lite = 0
@@ -77,6 +103,7 @@ class WordReference:
     name: str = None
     matches: str = None
     summary: str = None
+    mode: SonaveebMode = None
 
 
 @dc.dataclass
@@ -106,21 +133,78 @@ class Sonaveeb:
         )
     }
     DEFAULT_MODE = SonaveebMode.Lite
+    WORD_INFO_CACHE_SIZE = 256
+    MAX_WORKERS = 4
 
-    def __init__(self):
+    def __init__(self, cache=None, html_parser=None, base_url=None, max_workers=None, policy=None,
+                 hedge_percentile=None):
+        '''
+        Args:
+            cache: Optional response cache, e.g. `cache.ResponseCache`.
+            html_parser: BeautifulSoup HTML parser name, the fastest available by default.
+            base_url: Server to send requests to instead of `BASE_URL`, e.g. a local
+                stand-in for testing. Word references still link to `BASE_URL`.
+            max_workers: Expected number of concurrent requests, `MAX_WORKERS` by default.
+                Connection pool is sized accordingly.
+            policy: Rate limiting, retries and circuit breaking of requests,
+                `resilience.RequestPolicy`. No limits by default.
+            hedge_percentile: Send a duplicate request when a request runs longer
+                than this percentile of recent latencies of its endpoint, e.g. 95,
+                and take the first response. Disabled if None.
+        '''
+        self.max_workers = max_workers or self.MAX_WORKERS
         self.session = requests.Session()
+        # Hedged requests run alongside the original ones, so they need their own connections
+        pool_size = self.max_workers if hedge_percentile is None else 2 * self.max_workers
+        adapter = requests.adapters.HTTPAdapter(pool_maxsize=pool_size)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+        self._session_lock = threading.Lock()
+        self.policy = policy or RequestPolicy()
+        self.hedger = None
+        if hedge_percentile is not None:
+            self.hedger = Hedger(hedge_percentile, max_workers=2 * self.max_workers)
+        self.base_url = base_url or self.BASE_URL
+        self.mode_urls = {
+            mode: LookupUrls(**{
+                k: v.replace(self.BASE_URL, self.base_url, 1)
+                for k, v in dc.asdict(urls).items()
+            })
+            for mode, urls in self.MODE_URLS.items()
+        }
+        self.cache = cache
+        self.html_parser = html_parser or default_html_parser()
+        # Parsed word info by (mode, word_id, lexemes_limit, examples_limit)
+        self.word_info_cache = LRUCache(self.WORD_INFO_CACHE_SIZE)
+        # Concurrent identical requests and parsing are done only once
+        self.request_flights = SingleFlight()
+        self.parse_flights = SingleFlight()
         self.set_mode(self.DEFAULT_MODE)
 
     def set_mode(self, mode: SonaveebMode) -> None:
-        '''Set Sõnaveeb mode.'''
-        self.urls = self.MODE_URLS[mode]
+        '''Set default Sõnaveeb mode for requests that don't specify it.
+
+        Concurrent requests capture the mode when they start, so for
+        them it's preferable to pass the mode explicitly instead.
+        '''
         self.mode = mode
 
-    def get_base_form(self, word: str, timeout=None) -> tp.Tuple[str, tp.List[str]]:
+    def with_policy(self, policy: RequestPolicy) -> 'Sonaveeb':
+        '''Get a client sharing the session and caches of this one, whose requests follow another policy.'''
+        client = copy.copy(self)
+        client.policy = policy
+        return client
+
+    def get_base_form(self, word: str, timeout=None, mode: SonaveebMode = None,
+                      deadline: Deadline = None) -> tp.Tuple[str, tp.List[str]]:
         '''Search for a base form of a requested word.
 
         Args:
             word: Estonian word in any form.
+            timeout: Timeout of every request in seconds.
+            mode: Sõnaveeb mode, the default one if None.
+            deadline: Time budget of the whole operation, `resilience.Deadline`.
+                Every request gets the remaining budget as its timeout, if shorter.
 
         Returns: tuple
             exact_match: The query word itself if it was in its
@@ -128,55 +212,118 @@ class Sonaveeb:
             base_forms: list of words in their base forms, a form
                 of which the query word could be.
         '''
-        self._ensure_session(timeout=timeout)
-        url = self.urls.forms.format(word=word)
-        resp = self._request(url, timeout=timeout)
-        data = resp.json()
-        base_forms = data['formWords']
-        exact_match = word if word in data['prefWords'] else None
-        return exact_match, base_forms
-
-    def get_references(self, base_form: str, lang='et', timeout=None, debug=False) -> tp.List[WordReference]:
+        mode = mode or self.mode
+        text = self._get(self._url(mode, 'forms', word=word), mode, timeout, deadline, 'forms')
+        return self._process_base_form(word, text)
+
+    def get_references(
+            self, base_form: str, lang='et', timeout=None, debug=False,
+            lexemes_limit=None, examples_limit=None, mode: SonaveebMode = None,
+            deadline: Deadline = None) -> tp.List[WordReference]:
         '''Get a list of references for all homonyms of the word.
 
         Args:
             base_form: Estonian word in its base form.
+            lexemes_limit, examples_limit: Limits for word info of the homonyms
+                that are parsed from the lookup page, see `get_word_info_by_reference`.
+            timeout, mode, deadline: See `get_base_form`.
 
         Returns:
             references: List of WordReference objects.
         '''
-        # Request word lookup page
-        dom = self._word_lookup_dom(base_form, timeout=None)
-        # Save HTML page for debugging
+        mode = mode or self.mode
+        args = (base_form, lang, mode, timeout, deadline, debug, lexemes_limit, examples_limit)
         if debug:
-            open(os.path.join('debug', f'lookup_{base_form}.html'), 'w').write(dom.prettify())
-        # Parse results
-        references = self._parse_search_results(dom, lang=lang)
-        return references
-
-    def get_word_info_by_reference(self, reference: WordReference, timeout=None, debug=False):
+            return self._fetch_references(*args)
+        # References are shared by coalesced calls, so each caller gets a copy
+        key = ('search', base_form, lang, mode, lexemes_limit, examples_limit)
+        return copy.deepcopy(self.parse_flights.do(key, self._fetch_references, *args))
+
+    def get_word_info_by_reference(
+            self, reference: WordReference, timeout=None, debug=False,
+            lexemes_limit=None, examples_limit=None, deadline: Deadline = None,
+            use_cache=True):
         '''Get word info from word reference.
 
         Args:
-            reference: WordReference object.
+            reference: WordReference object. Its mode is used, if it has one,
+                otherwise the default mode.
+            lexemes_limit: Maximum number of lexemes to parse, all if None.
+            examples_limit: Maximum number of examples to parse per lexeme, all if None.
+            timeout, deadline: See `get_base_form`.
+            use_cache: Whether cached pages and word infos can be used. If not set,
+                the page is requested from Sõnaveeb, and the caches are updated with it.
 
         Returns:
             word_info: WordInfo object.
         '''
-        # Request word details page
-        dom = self._word_details_dom(reference.word_id, timeout=timeout)
-
-        # Save HTML page for debugging
+        mode = reference.mode or self.mode
+        key = (mode, reference.word_id, lexemes_limit, examples_limit)
         if debug:
-            open(os.path.join('debug', f'details_{reference.name}.html'), 'w').write(dom.prettify())
+            return self._fetch_word_info(reference, key, timeout, deadline, debug, use_cache)
+        if use_cache and (word_info := self._cached_word_info(key)) is not None:
+            return word_info
+        # Word info is shared by coalesced calls, so each caller gets a copy
+        word_info = self.parse_flights.do(
+            ('details', use_cache) + key,
+            self._fetch_word_info, reference, key, timeout, deadline, False, use_cache
+        )
+        return copy.deepcopy(word_info)
 
-        # Parse results
-        word_info = self._parse_word_info(dom)
-        word_info.word_id = reference.word_id
-        word_info.url = reference.url
-        return word_info
+    def iter_word_infos(
+            self, references: tp.List[WordReference], max_workers=None, timeout=None,
+            lexemes_limit=None, examples_limit=None, deadline: Deadline = None,
+            use_cache=True) -> tp.Iterator[tp.Tuple[int, Future]]:
+        '''Get word infos for multiple references concurrently, as they complete.
+
+        Requests are started by a pool of at most `max_workers` threads in the
+        order of references, but results are yielded in the order they complete,
+        each paired with the index of its reference. Closing the iterator cancels
+        the requests that haven't started yet.
 
-    def get_word_info(self, word: str, lang='et', timeout=None, debug=False):
+        Args:
+            references: List of WordReference objects.
+            max_workers: Maximum number of concurrent requests, `max_workers` of the client by default.
+            timeout, lexemes_limit, examples_limit, deadline, use_cache: See `get_word_info_by_reference`.
+
+        Yields: tuple
+            index: Index of the reference.
+            future: Completed future holding WordInfo object or raising an error.
+        '''
+        executor = ThreadPoolExecutor(max_workers=max_workers or self.max_workers)
+        try:
+            futures = {
+                executor.submit(
+                    self.get_word_info_by_reference, reference, timeout,
+                    lexemes_limit=lexemes_limit, examples_limit=examples_limit, deadline=deadline,
+                    use_cache=use_cache
+                ): index
+                for index, reference in enumerate(references)
+            }
+            for future in as_completed(futures):
+                yield futures[future], future
+        finally:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+    def get_word_infos(self, references: tp.List[WordReference], max_workers=None, timeout=None,
+                       lexemes_limit=None, examples_limit=None, deadline: Deadline = None) -> tp.List[WordInfo]:
+        '''Get word infos for multiple references concurrently.
+
+        See `iter_word_infos` for arguments.
+
+        Returns:
+            word_infos: List of WordInfo objects in the order of references.
+        '''
+        word_infos = [None] * len(references)
+        completed = self.iter_word_infos(references, max_workers, timeout, lexemes_limit, examples_limit, deadline)
+        for index, future in completed:
+            word_infos[index] = future.result()
+        return word_infos
+
+    def get_word_info(
+            self, word: str, lang='et', timeout=None, debug=False,
+            lexemes_limit=None, examples_limit=None, mode: SonaveebMode = None,
+            deadline: Deadline = None):
         '''Get word info for the first matching homonym of a requested word.
 
         This is a high-level API that performs end-to-end search from a
@@ -186,42 +333,124 @@ class Sonaveeb:
 
         Args:
             word: Estonian word in any form.
+            lexemes_limit, examples_limit: See `get_word_info_by_reference`.
+            timeout, mode: See `get_base_form`.
+            deadline: Time budget of the whole lookup, all its requests
+                share it. See `get_base_form`.
 
         Returns:
             word_info: WordInfo object.
         '''
-        match, forms = self.get_base_form(word, timeout=timeout)
+        mode = mode or self.mode
+        match, forms = self.get_base_form(word, timeout=timeout, mode=mode, deadline=deadline)
         if match is None and len(forms) == 0:
             return None
         word = forms[0] if match is None else match
-        homonyms = self.get_references(word, lang, timeout, debug)
+        limits = dict(lexemes_limit=lexemes_limit, examples_limit=examples_limit)
+        homonyms = self.get_references(word, lang, timeout, debug, mode=mode, deadline=deadline, **limits)
         if len(homonyms) == 0:
             return None
-        return self.get_word_info_by_reference(homonyms[0], timeout, debug)
+        return self.get_word_info_by_reference(homonyms[0], timeout, debug, deadline=deadline, **limits)
 
-    def _request(self, *args, **kwargs):
-        resp = self.session.get(*args, **kwargs)
-        if resp.status_code != 200:
-            raise RuntimeError(f'Request failed: {resp.status_code}')
-        return resp
-
-    def _ensure_session(self, timeout=None):
+    def _request(self, url, timeout=None, deadline=None, kind=None):
+        # Timeout is evaluated for every attempt, as retries consume the budget
+        send = lambda: self.policy.get(
+            lambda: self.session.get(url, timeout=request_timeout(timeout, deadline)),
+            deadline=deadline
+        )
+        if self.hedger is None or kind is None:
+            return send()
+        return self.hedger.call(kind, send)
+
+    def _get(self, url, mode, timeout=None, deadline=None, kind=None, use_cache=True) -> str:
+        '''Get response text, from the cache if possible and allowed.'''
+        if use_cache and self.cache is not None:
+            if (text := self.cache.get(mode.name, url)) is not None:
+                return text
+        return self.request_flights.do(url, self._fetch, url, mode, timeout, deadline, kind)
+
+    def _fetch(self, url, mode, timeout=None, deadline=None, kind=None) -> str:
+        self._ensure_session(timeout, deadline)
+        text = self._request(url, timeout, deadline, kind).text
+        if self.cache is not None:
+            self.cache.put(mode.name, url, text)
+        return text
+
+    def _ensure_session(self, timeout=None, deadline=None):
         if 'ww-sess' not in self.session.cookies:
-            self._request(self.BASE_URL)
+            # Only one thread obtains the session cookie, others wait for it
+            with self._session_lock:
+                if 'ww-sess' not in self.session.cookies:
+                    self._request(self.base_url, timeout, deadline)
 
-    def _word_lookup_dom(self, word, timeout=None):
-        self._ensure_session(timeout=timeout)
-        url = self.urls.search.format(word=word)
-        resp = self._request(url, timeout=timeout)
-        return bs4.BeautifulSoup(resp.text, 'html.parser')
+    def _url(self, mode, kind, **params) -> str:
+        '''Get URL of the specified kind ('forms', 'search', or 'details') for the mode.'''
+        return getattr(self.mode_urls[mode], kind).format(**params)
+
+    def _fetch_references(self, base_form, lang, mode, timeout=None, deadline=None, debug=False,
+                          lexemes_limit=None, examples_limit=None):
+        # Request word lookup page
+        text = self._get(self._url(mode, 'search', word=base_form), mode, timeout, deadline, 'search')
+        return self._process_references(text, base_form, lang, mode, debug, lexemes_limit, examples_limit)
+
+    def _fetch_word_info(self, reference, key, timeout=None, deadline=None, debug=False, use_cache=True):
+        # Request word details page
+        mode, word_id, _lexemes_limit, _examples_limit = key
+        url = self._url(mode, 'details', word_id=word_id)
+        text = self._get(url, mode, timeout, deadline, 'details', use_cache)
+        return self._process_word_info(text, reference, key, debug)
+
+    # Processing of responses. Shared by sync and async clients.
+
+    def _process_base_form(self, word, text):
+        data = json.loads(text)
+        base_forms = data['formWords']
+        exact_match = word if word in data['prefWords'] else None
+        return exact_match, base_forms
+
+    def _process_references(self, text, base_form, lang, mode, debug=False, lexemes_limit=None, examples_limit=None):
+        dom = self._make_dom(text)
+        # Save HTML page for debugging
+        if debug:
+            open(os.path.join('debug', f'lookup_{base_form}.html'), 'w').write(dom.prettify())
+        # Parse results
+        references = self._parse_search_results(dom, lang=lang, mode=mode)
+        # Lookup page contains details of some homonyms (e.g. the selected one),
+        # cache them to save on details requests
+        for reference in references:
+            if self._has_word_details(dom, reference.word_id):
+                word_info = self._parse_word_info(
+                    dom, word_id=reference.word_id,
+                    lexemes_limit=lexemes_limit, examples_limit=examples_limit
+                )
+                word_info.url = reference.url
+                key = (mode, reference.word_id, lexemes_limit, examples_limit)
+                self.word_info_cache.put(key, word_info)
+        return references
+
+    def _cached_word_info(self, key):
+        # Cached objects are copied both ways to protect them from modifications
+        if (word_info := self.word_info_cache.get(key)) is not None:
+            return copy.deepcopy(word_info)
+        return None
+
+    def _process_word_info(self, text, reference, key, debug=False):
+        _mode, _word_id, lexemes_limit, examples_limit = key
+        dom = self._make_dom(text)
+        # Save HTML page for debugging
+        if debug:
+            open(os.path.join('debug', f'details_{reference.name}.html'), 'w').write(dom.prettify())
+        # Parse results
+        word_info = self._parse_word_info(dom, lexemes_limit=lexemes_limit, examples_limit=examples_limit)
+        word_info.word_id = reference.word_id
+        word_info.url = reference.url
+        self.word_info_cache.put(key, copy.deepcopy(word_info))
+        return word_info
 
-    def _word_details_dom(self, word_id, timeout=None):
-        self._ensure_session(timeout=timeout)
-        url = self.urls.details.format(word_id=word_id)
-        resp = self._request(url, timeout=timeout)
-        return bs4.BeautifulSoup(resp.text, 'html.parser')
+    def _make_dom(self, text):
+        return bs4.BeautifulSoup(text, self.html_parser)
 
-    def _parse_search_results(self, dom, lang=None):
+    def _parse_search_results(self, dom, lang=None, mode=None):
         # Parse homonyms list
         homonyms = []
         for homonym in dom.find_all('li', class_='homonym-list-item'):
@@ -238,156 +467,218 @@ class Sonaveeb:
                 kwargs['matches'] = matches.string
             if summary := homonym.find(class_='homonym-intro'):
                 kwargs['summary'] = summary.string
+            kwargs['mode'] = mode
             homonyms.append(WordReference(**kwargs))
         # Filter by language
         if lang is not None:
             homonyms = [r for r in homonyms if r.lang == lang]
         return homonyms
 
-    def _parse_lexeme_definition(self, definition_row):
-        '''Extract definition and language level from a definition row'''
-        definition = None
-        level = None
-
-        if not definition_row:
-            return definition, level
+    def _get_lexeme_number(self, match, fallback_number):
+        '''Get lexeme number from match or use fallback'''
+        if lexeme_number := match.find(class_='lexeme-level'):
+            return lexeme_number.string
+        return str(fallback_number)
 
-        # Extract language level if present
-        if level := definition_row.find(class_='additional-meta', title='Keeleoskustase'):
-            level = level.string.strip()
+    def _parse_lexeme(self, section, number, examples_limit=None) -> LexemeInfo:
+        '''Extract lexeme info from a lexeme section in a single traversal.
 
-        # Extract definitions
+        Collects definition and language level (from the first definition row),
+        rection patterns (from the first rection block, e.g. ["keda/mida*",
+        "kellel + mida teha"]), translations, examples (up to `examples_limit`),
+        tags, and synonyms. Once the examples are collected, the rest of them
+        aren't visited.
+        '''
+        lexeme = LexemeInfo(number=number)
         definitions = []
-        for def_entry in definition_row.find_all(id=re.compile('^definition-entry')):
-            if def_text := self._remove_eki_tags(def_entry.span):
-                definitions.append(def_text.strip())
+        # Translation panels in document order: [lang, has_lang, values]
+        panels = []
+        # Only the first definition row, level tag, and rection block are used
+        found = dict(definition_row=False, level=False, rection=False)
+
+        def visit(element, in_definition, in_rection, active_panels):
+            for el in element.children:
+                if not isinstance(el, bs4.Tag):
+                    continue
+                classes = el.get('class') or ()
+                el_id = el.get('id') or ''
+                if (examples_limit is not None and len(lexeme.examples) >= examples_limit
+                        and any(c.startswith('example') for c in classes)):
+                    continue
+                child_in_definition = in_definition
+                child_in_rection = in_rection
+                child_panels = active_panels
+
+                # Lexeme-wide fields
+                if 'tag' in classes and el.string:
+                    lexeme.tags.append(el.string)
+                    if in_rection and el.name == 'span':
+                        lexeme.rection.append(el.string)
+                if 'example-text-value' in classes and el.string:
+                    lexeme.examples.append(el.string)
+                if el.name == 'a' and 'synonym' in classes and el.span and el.span.span:
+                    lexeme.synonyms.append(el.span.span.string)
+
+                # Definition row
+                if not found['definition_row'] and 'definition-row' in classes:
+                    found['definition_row'] = True
+                    child_in_definition = True
+                if in_definition:
+                    if (not found['level'] and 'additional-meta' in classes
+                            and el.get('title') == 'Keeleoskustase'):
+                        found['level'] = True
+                        lexeme.level = el.string.strip()
+                    if el_id.startswith('definition-entry'):
+                        if def_text := self._remove_eki_tags(el.span):
+                            definitions.append(def_text.strip())
+
+                # Rection
+                if not found['rection'] and 'rekts-est' in classes:
+                    found['rection'] = True
+                    child_in_rection = True
+
+                # Translations
+                if active_panels:
+                    if 'lang-code' in classes:
+                        for panel in active_panels:
+                            if not panel[1]:
+                                panel[0], panel[1] = el.string, True
+                    if el.name == 'a' and 'matching-word' in classes:
+                        value = self._remove_eki_tags(el.span.span)
+                        for panel in active_panels:
+                            panel[2].append(value)
+                if el_id.startswith('matches-show-more-panel'):
+                    panel = [None, False, []]
+                    panels.append(panel)
+                    child_panels = active_panels + [panel]
+
+                visit(el, child_in_definition, child_in_rection, child_panels)
+
+        visit(section, False, False, [])
 
         if definitions:
-            definition = ' '.join(definitions)
+            lexeme.definition = ' '.join(definitions)
+        for lang, has_lang, values in panels:
+            if has_lang and values:
+                lexeme.translations[lang] = values
+        return lexeme
+
+    def _parse_morphology(self, morphology_paradigm) -> tp.List[tp.Tuple[str]]:
+        '''Extract forms from morphology paradigm table'''
+        morphology = []
+        if morphology_paradigm is not None:
+            if morphology_table := morphology_paradigm.find('table'):
+                for row in morphology_table.find_all('tr'):
+                    cells = row.find_all('span', class_='form-value-field')
+                    if cells:
+                        entry = tuple(self._remove_eki_tags(c) for c in cells)
+                        morphology.append(entry)
+        return morphology
 
-        return definition, level
+    def _has_word_details(self, dom, word_id) -> bool:
+        '''Check if the page contains lexemes of the specified homonym.'''
+        word_details = dom.find('div', attrs={'data-homonymnr': word_id})
+        return word_details is not None and word_details.find(id=LEXEME_SECTION_ID) is not None
 
-    def _parse_lexeme_rection(self, match) -> tp.List[str]:
-        '''Extract rection patterns from a lexeme section.
+    def _parse_word_info(self, dom, word_id=None, lexemes_limit=None, examples_limit=None):
+        '''Parse word info from a details or lookup page.
 
         Args:
-            match: Element containing the lexeme section
-
-        Returns:
-            List of rection patterns (e.g. ["keda/mida*", "kellel + mida teha"])
+            dom: Page DOM.
+            word_id: Homonym to parse, the one selected on the page by default.
+            lexemes_limit: Maximum number of lexemes to parse.
+            examples_limit: Maximum number of examples to parse per lexeme.
         '''
-        rection_div = match.find(class_='rekts-est')
-        if not rection_div:
-            return []
-
-        rections = []
-        for span in rection_div.find_all('span', class_='tag'):
-            if span.string:
-                rections.append(span.string)
-        return rections
-
-    def _parse_lexeme_translations(self, translation_panels):
-        '''Extract translations from translation panels'''
-        translations = {}
-        for panel in translation_panels:
-            if lang_code := panel.find(class_='lang-code'):
-                lang = lang_code.string
-                values = [
-                    self._remove_eki_tags(a.span.span)
-                    for a in panel.find_all('a', class_='matching-word')
-                ]
-                if values:
-                    translations[lang] = values
-        return translations
-
-    def _parse_lexeme_examples(self, match):
-        '''Extract example sentences'''
-        examples = []
-        for example in match.find_all(class_='example-text-value'):
-            if example.string:
-                examples.append(example.string)
-        return examples
-
-    def _get_lexeme_number(self, match, fallback_number):
-        '''Get lexeme number from match or use fallback'''
-        if lexeme_number := match.find(class_='lexeme-level'):
-            return lexeme_number.string
-        return str(fallback_number)
-
-    def _parse_word_info(self, dom):
         info = WordInfo()
 
-        # Get the word_id from the url
-        if word_id_input := dom.find('input', id='selected-word-homonym-nr'):
+        if word_id is not None:
+            info.word_id = word_id
+        elif word_id_input := dom.find('input', id='selected-word-homonym-nr'):
+            # Get the word_id from the url
             info.word_id = word_id_input['value']
 
-        # Get basic word info
-        if homonym_name := dom.find(class_='homonym-name'):
+        # Find specific word-details div for this homonym
+        dom_to_parse = dom
+        if info.word_id:
+            if word_details := dom.find('div', attrs={'data-homonymnr': info.word_id}):
+                dom_to_parse = word_details
+
+        # Get basic word info. For an explicitly requested homonym only its own
+        # details and search result are used, since a lookup page contains
+        # other homonyms too.
+        if word_id is None:
+            headers = [dom]
+        else:
+            headers = [dom_to_parse] if dom_to_parse is not dom else []
+            if word_id_input := dom.find('input', attrs=dict(name='word-id', value=str(word_id))):
+                if homonym := word_id_input.find_parent('li', class_='homonym-list-item'):
+                    headers.append(homonym)
+        homonym_name = self._find_first(headers, class_='homonym-name')
+        if homonym_name is not None and homonym_name.span is not None:
             info.word = homonym_name.span.string
 
-        if word_class_tag := dom.find(class_='content-title').find(class_='tag'):
+        content_title = self._find_first(headers, class_='content-title')
+        if content_title is not None and (word_class_tag := content_title.find(class_='tag')):
             info.word_class = word_class_tag.string
 
         # Initialize lexemes list
         info.lexemes = []
 
-        # Find specific word-details div for this homonym
-        dom_to_parse = dom
-        if info.word_id:
-            if word_details := dom.find('div', attrs={'data-homonymnr': info.word_id}):
-                dom_to_parse = word_details
-
-        # Parse each lexeme section
+        # Find and parse lexeme sections and morphology in a single traversal.
+        # Once the lexemes are collected, the other sections are skipped over,
+        # and the traversal stops as soon as morphology is found too.
+        morphology_paradigm = None
         sequential_number = 1
-        for match in dom_to_parse.find_all(id=re.compile('^lexeme-section')):
-            # Get lexeme number
-            number = self._get_lexeme_number(match, sequential_number)
-            sequential_number += 1
-
-            # Skip sub-definitions
-            if number and '.' in number:
-                continue
-
-            # Parse lexeme details
-            definition, level = self._parse_lexeme_definition(match.find(class_='definition-row'))
-            translations = self._parse_lexeme_translations(
-                match.find_all(id=re.compile('^matches-show-more-panel'))
-            )
-            examples = self._parse_lexeme_examples(match)
-            rection = self._parse_lexeme_rection(match)
-            tags = [t.string for t in match.find_all(class_='tag') if t.string]
-            synonyms = [
-                a.span.span.string
-                for a in match.find_all('a', class_='synonym')
-                if a.span and a.span.span
-            ]
-
-            # Create lexeme object
-            lexeme = LexemeInfo(
-                definition=definition,
-                rection=rection,
-                synonyms=synonyms,
-                translations=translations,
-                examples=examples,
-                tags=tags,
-                number=number,
-                level=level,
-            )
-
-            info.lexemes.append(lexeme)
+        el = dom_to_parse.contents[0] if dom_to_parse.contents else None
+        while el is not None:
+            lexemes_done = lexemes_limit is not None and len(info.lexemes) >= lexemes_limit
+            if lexemes_done and morphology_paradigm is not None:
+                break
+            descend = True
+            if not isinstance(el, bs4.Tag):
+                pass
+            elif LEXEME_SECTION_ID.match(el.get('id') or ''):
+                if lexemes_done:
+                    descend = False
+                else:
+                    # Get lexeme number
+                    number = self._get_lexeme_number(el, sequential_number)
+                    sequential_number += 1
+                    # Skip sub-definitions
+                    if not (number and '.' in number):
+                        info.lexemes.append(self._parse_lexeme(el, number, examples_limit))
+            elif morphology_paradigm is None and 'morphology-paradigm' in (el.get('class') or ()):
+                morphology_paradigm = el
+                descend = False
+            el = self._next_element(el, dom_to_parse, descend)
 
         # Parse morphology
-        info.morphology = []
-        if morphology_paradigm := dom_to_parse.find(class_='morphology-paradigm'):
-            if morphology_table := morphology_paradigm.find('table'):
-                for row in morphology_table.find_all('tr'):
-                    cells = row.find_all('span', class_='form-value-field')
-                    if cells:
-                        entry = tuple(self._remove_eki_tags(c) for c in cells)
-                        info.morphology.append(entry)
+        info.morphology = self._parse_morphology(morphology_paradigm)
 
         return info
 
+    @staticmethod
+    def _find_first(elements, **kwargs):
+        '''Find the first matching tag within the elements, in their order, or None.'''
+        for element in elements:
+            if (found := element.find(**kwargs)) is not None:
+                return found
+        return None
+
+    @staticmethod
+    def _next_element(element, root, descend=True):
+        '''Get the next element of the `root` subtree in document order, or None.
+
+        If `descend` is not set, descendants of the element are skipped.
+        '''
+        if descend and isinstance(element, bs4.Tag) and element.contents:
+            return element.contents[0]
+        while element is not root:
+            if element.next_sibling is not None:
+                return element.next_sibling
+            element = element.parent
+        return None
+
     @staticmethod
     def _remove_eki_tags(element):
         if not element:
@@ -402,3 +693,104 @@ class Sonaveeb:
             result = result.replace(f'</{tag}>', '')
 
         return result.strip()
+
+
+class AsyncSonaveeb:
+    '''Asyncio flavour of the Sõnaveeb client.
+
+    Coroutines mirror the API of `Sonaveeb`, which does the actual work:
+    the same requests, caches and parsing are used by both clients.
+    Anki bundles no asyncio HTTP client, so blocking requests run in a
+    pool of I/O threads, while parsing is offloaded to another executor
+    to keep the event loop responsive.
+
+    Args:
+        sonaveeb: Sync client to wrap, a new one if None.
+        io_workers: Maximum number of concurrent requests, `max_workers`
+            of the sync client by default.
+        parse_executor: Thread pool for parsing, the default executor of
+            the event loop if None. Parsing fills the caches of the sync
+            client, so it can't run in other processes.
+    '''
+
+    def __init__(self, sonaveeb: Sonaveeb = None, io_workers=None, parse_executor=None):
+        self.sonaveeb = sonaveeb or Sonaveeb()
+        self.io_executor = ThreadPoolExecutor(max_workers=io_workers or self.sonaveeb.max_workers)
+        self.parse_executor = parse_executor
+
+    def close(self) -> None:
+        self.io_executor.shutdown(wait=False, cancel_futures=True)
+
+    async def get_base_form(self, word: str, timeout=None, mode: SonaveebMode = None,
+                            deadline: Deadline = None) -> tp.Tuple[str, tp.List[str]]:
+        '''See `Sonaveeb.get_base_form`.'''
+        mode = mode or self.sonaveeb.mode
+        text = await self._get(self.sonaveeb._url(mode, 'forms', word=word), mode, timeout, deadline, 'forms')
+        # Decoding small JSON is cheaper than a trip to the executor
+        return self.sonaveeb._process_base_form(word, text)
+
+    async def get_references(
+            self, base_form: str, lang='et', timeout=None, debug=False,
+            lexemes_limit=None, examples_limit=None, mode: SonaveebMode = None,
+            deadline: Deadline = None) -> tp.List[WordReference]:
+        '''See `Sonaveeb.get_references`.'''
+        mode = mode or self.sonaveeb.mode
+        text = await self._get(self.sonaveeb._url(mode, 'search', word=base_form), mode, timeout, deadline, 'search')
+        return await self._parse(
+            self.sonaveeb._process_references,
+            text, base_form, lang, mode, debug, lexemes_limit, examples_limit
+        )
+
+    async def get_word_info_by_reference(
+            self, reference: WordReference, timeout=None, debug=False,
+            lexemes_limit=None, examples_limit=None, deadline: Deadline = None,
+            use_cache=True) -> WordInfo:
+        '''See `Sonaveeb.get_word_info_by_reference`.'''
+        mode = reference.mode or self.sonaveeb.mode
+        key = (mode, reference.word_id, lexemes_limit, examples_limit)
+        if not debug and use_cache and (word_info := self.sonaveeb._cached_word_info(key)) is not None:
+            return word_info
+        url = self.sonaveeb._url(mode, 'details', word_id=reference.word_id)
+        text = await self._get(url, mode, timeout, deadline, 'details', use_cache)
+        return await self._parse(self.sonaveeb._process_word_info, text, reference, key, debug)
+
+    async def get_word_infos(self, references: tp.List[WordReference], timeout=None,
+                             lexemes_limit=None, examples_limit=None,
+                             deadline: Deadline = None) -> tp.List[WordInfo]:
+        '''Get word infos for multiple references concurrently.
+
+        Concurrency is bounded by the I/O pool. See `Sonaveeb.get_word_infos`.
+        '''
+        return await asyncio.gather(*[
+            self.get_word_info_by_reference(
+                reference, timeout, lexemes_limit=lexemes_limit, examples_limit=examples_limit,
+                deadline=deadline
+            )
+            for reference in references
+        ])
+
+    async def get_word_info(
+            self, word: str, lang='et', timeout=None, debug=False,
+            lexemes_limit=None, examples_limit=None, mode: SonaveebMode = None,
+            deadline: Deadline = None) -> tp.Optional[WordInfo]:
+        '''See `Sonaveeb.get_word_info`.'''
+        mode = mode or self.sonaveeb.mode
+        match, forms = await self.get_base_form(word, timeout=timeout, mode=mode, deadline=deadline)
+        if match is None and len(forms) == 0:
+            return None
+        word = forms[0] if match is None else match
+        limits = dict(lexemes_limit=lexemes_limit, examples_limit=examples_limit)
+        homonyms = await self.get_references(word, lang, timeout, debug, mode=mode, deadline=deadline, **limits)
+        if len(homonyms) == 0:
+            return None
+        return await self.get_word_info_by_reference(homonyms[0], timeout, debug, deadline=deadline, **limits)
+
+    async def _get(self, url, mode, timeout=None, deadline=None, kind=None, use_cache=True) -> str:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(
+            self.io_executor, self.sonaveeb._get, url, mode, timeout, deadline, kind, use_cache
+        )
+
+    async def _parse(self, func, *args):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.parse_executor, func, *args)
@@ -9,12 +9,10 @@ from aqt.qt import (
 )
 from aqt import colors
 from aqt.theme import theme_manager
-from aqt.operations import QueryOp
 
 from ..sonaveeb import LexemeInfo
-from ..gtranslate import cross_translate
-from ..globals import REQUEST_TIMEOUT
 from .common import HSeparator
+from .translation import CrossTranslationBatcher
 
 
 class LexemeWidget(QWidget):
@@ -27,11 +25,13 @@ class LexemeWidget(QWidget):
             self,
             lexeme: LexemeInfo,
             word_class: str,
+            translation_batcher: CrossTranslationBatcher,
             examples_limit: int = None,
             translations_limit: int = None,
             parent: Optional[QWidget] = None):
         super().__init__(parent)
         self.lexeme = lexeme
+        self.translation_batcher = translation_batcher
         self.word_class = word_class
         self.examples_limit = examples_limit
         self.translations_limit = translations_limit
@@ -116,20 +116,22 @@ class LexemeWidget(QWidget):
 
     def request_cross_translations(self):
         '''Request translations for a specific lexeme'''
-        operation = QueryOp(
-            parent=self,
-            op=lambda col: cross_translate(
-                sources=self.lexeme.translations,
-                lang=self.lang,
-                timeout=REQUEST_TIMEOUT,
-            ),
-            success=self._on_translations_received
-        ).failure(self._on_translations_request_error)
-        operation.run_in_background()
+        # Requests of all lexemes are batched together
+        self.translation_batcher.request(
+            sources=self.lexeme.translations,
+            lang=self.lang,
+            on_success=self._on_translations_received,
+            on_failure=self._on_translations_request_error,
+        )
         self.translations_requested.emit(True)
 
     def _on_translations_request_error(self, error):
         '''Handle translation request errors'''
+        # Test if this widget still exists
+        try:
+            self.isVisible()
+        except RuntimeError:
+            return
         self.translations_requested.emit(False)
         self.set_translation_status('Failed to translate :(')
 
@@ -161,6 +163,7 @@ class LexemesContainer(QWidget):
 
     def __init__(
             self,
+            translation_batcher: CrossTranslationBatcher,
             lexemes: List[LexemeInfo] = None,
             lexemes_limit: int = None,
             examples_limit: int = None,
@@ -168,6 +171,7 @@ class LexemesContainer(QWidget):
             parent: Optional[QWidget] = None):
         super().__init__(parent)
         self.lexemes_limit = lexemes_limit
+        self.translation_batcher = translation_batcher
         self.examples_limit = examples_limit
         self.translations_limit = translations_limit
         self.layout = QVBoxLayout(self)
@@ -192,6 +196,7 @@ class LexemesContainer(QWidget):
                 word_class=word_class,
                 examples_limit=self.examples_limit,
                 translations_limit=self.translations_limit,
+                translation_batcher=self.translation_batcher,
                 parent=self
             )
             lexeme_widget.translations_updated.connect(self._on_child_translations_updated)
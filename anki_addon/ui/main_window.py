@@ -1,25 +1,46 @@
+import functools
+
 import anki.lang
 from aqt.qt import (
     pyqtSignal, Qt, QEvent, QWidget, QHBoxLayout, QVBoxLayout, QLabel, QLineEdit,
-    QPushButton, QButtonGroup, QStackedWidget, QScrollArea, QFrame, QMessageBox
+    QPushButton, QButtonGroup, QStackedWidget, QScrollArea, QFrame, QMessageBox, QTimer
 )
-from aqt.operations import QueryOp
+from aqt.operations import QueryOp, CollectionOp
+from aqt.utils import tooltip
 from aqt.theme import theme_manager
 from aqt import mw, colors, gui_hooks
 
 from ..sonaveeb import Sonaveeb, SonaveebMode
+from ..resilience import Deadline
 from ..notetypes import NoteTypeManager
-from ..globals import REQUEST_TIMEOUT
+from ..notes import NoteIndex, AddNotesError, add_notes
+from ..globals import REQUEST_TIMEOUT, OPERATION_DEADLINE, REQUEST_WORKERS, LEXEMES_LIMIT, EXAMPLES_LIMIT
 from .word_info import WordInfoPanel
+from .translation import CrossTranslationBatcher
 from .common import VSeparator, ShrinkingComboBox
 
 
 class SonaveebDialog(QWidget):
-    def __init__(self, notetype_manager=None, sonaveeb=None, parent=None):
+    # Delay to check existing notes of word infos received together in one search
+    NOTES_CHECK_DELAY_MS = 50
+
+    def __init__(self, notetype_manager=None, sonaveeb=None, note_index=None, parent=None):
         super().__init__(parent=parent)
         self._notetype_manager = notetype_manager or NoteTypeManager()
         self._sonaveeb = sonaveeb or Sonaveeb()
+        if note_index is None:
+            # Own index has to follow the changes of notes too
+            note_index = NoteIndex(self._notetype_manager)
+            note_index.register_hooks()
+        self._note_index = note_index
         self._config = mw.addonManager.getConfig(__name__)
+        self._translation_batcher = CrossTranslationBatcher(self)
+        # Panels with received word info, whose existing notes are yet to be checked
+        self._unchecked_panels = []
+        self._notes_check_timer = QTimer(self)
+        self._notes_check_timer.setSingleShot(True)
+        self._notes_check_timer.setInterval(self.NOTES_CHECK_DELAY_MS)
+        self._notes_check_timer.timeout.connect(self._check_unchecked_panels)
 
         notetype_manager.create_missing_defaults()
 
@@ -134,9 +155,14 @@ class SonaveebDialog(QWidget):
         self._search.returnPressed.connect(self._on_search_triggered)
         self._search_button = QPushButton('Search')
         self._search_button.clicked.connect(self._on_search_triggered)
+        self._add_all_button = QPushButton('Add All')
+        self._add_all_button.setToolTip('Add notes of all found words that are not in the deck yet')
+        self._add_all_button.clicked.connect(self._on_add_all_button_clicked)
+        self._add_all_button.hide()
         search_layout = QHBoxLayout()
         search_layout.addWidget(self._search)
         search_layout.addWidget(self._search_button)
+        search_layout.addWidget(self._add_all_button)
         search_layout.setAlignment(Qt.AlignmentFlag.AlignHCenter)
         search_layout.setContentsMargins(10, 5, 10, 5)
         search_bar = QWidget()
@@ -218,6 +244,8 @@ class SonaveebDialog(QWidget):
 
         # Track Google translate requests in progress
         self.pending_translation_requests = set()
+        # Incremented whenever search results are cleared to discard stale responses
+        self._search_generation = 0
 
     def language_code(self):
         return self._lang_selector.currentData()
@@ -241,7 +269,18 @@ class SonaveebDialog(QWidget):
         self._status.setText(status)
         self._content_stack.setCurrentWidget(self._status)
 
+    def check_existing_notes(self, word_panels):
+        '''Check existing notes of multiple word panels in the note index.'''
+        word_panels = [p for p in word_panels if p.word_info is not None]
+        words = [(p.word_info.word_id, p.word_info.url) for p in word_panels]
+        notes = self._note_index.find(mw.col, self.deck_id(), words)
+        for word_panel in word_panels:
+            word_panel.set_existing_note(notes.get(word_panel.word_info.word_id))
+
     def clear_search_results(self):
+        self._search_generation += 1
+        self._unchecked_panels = []
+        self._add_all_button.hide()
         self._form_selector.clear()
         while self._search_results_layout.count():
             child = self._search_results_layout.takeAt(0)
@@ -253,17 +292,55 @@ class SonaveebDialog(QWidget):
         self._mode_selector.setEnabled(False)
         self._search.setEnabled(False)
         self.set_status('Searching...')
+        mode = self.sonaveeb_mode()
         operation = QueryOp(
             parent=self,
-            op=lambda col: self._search_candidates(query, REQUEST_TIMEOUT),
+            op=lambda col: self._search_candidates(query, mode, REQUEST_TIMEOUT),
             success=self._on_search_results_received
         ).failure(self._on_search_error)
         operation.run_in_background()
 
-    def _search_candidates(self, query, timeout=None):
-        match, forms = self._sonaveeb.get_base_form(query, timeout=timeout)
+    def _request_word_infos(self, word_panels):
+        '''Request word info for all panels as one batch with bounded concurrency.'''
+        generation = self._search_generation
+        references = [panel.word_reference for panel in word_panels]
+        # Indices of the panels whose results were passed to the main thread
+        received = set()
+
+        def fetch(col):
+            completed = self._sonaveeb.iter_word_infos(
+                references,
+                max_workers=REQUEST_WORKERS,
+                timeout=REQUEST_TIMEOUT,
+                lexemes_limit=LEXEMES_LIMIT,
+                examples_limit=EXAMPLES_LIMIT,
+                deadline=Deadline(OPERATION_DEADLINE),
+            )
+            for index, future in completed:
+                if generation != self._search_generation:
+                    # Results are outdated, cancel the remaining requests
+                    completed.close()
+                    break
+                callback = functools.partial(self._on_word_info_received, generation, word_panels[index], future)
+                received.add(index)
+                mw.taskman.run_on_main(callback)
+
+        operation = QueryOp(
+            parent=self,
+            op=fetch,
+            success=lambda _: None
+        ).failure(functools.partial(self._on_word_infos_error, generation, word_panels, received))
+        operation.run_in_background()
+
+    def _search_candidates(self, query, mode, timeout=None):
+        # Both requests share one time budget
+        deadline = Deadline(OPERATION_DEADLINE)
+        match, forms = self._sonaveeb.get_base_form(query, timeout=timeout, mode=mode, deadline=deadline)
         if match is not None:
-            references = self._sonaveeb.get_references(match, timeout=timeout)
+            references = self._sonaveeb.get_references(
+                match, timeout=timeout, mode=mode, deadline=deadline,
+                lexemes_limit=LEXEMES_LIMIT, examples_limit=EXAMPLES_LIMIT
+            )
         else:
             references = []
         return references, forms
@@ -296,7 +373,6 @@ class SonaveebDialog(QWidget):
 
     def _on_mode_changed(self, _index):
         mode = self.sonaveeb_mode()
-        self._sonaveeb.set_mode(mode)
         self._save_config_value('mode', mode.name)
         if self._search.text().strip():
             self._on_search_triggered()
@@ -305,6 +381,7 @@ class SonaveebDialog(QWidget):
         deck_id = self.deck_id()
         for word_panel in self.search_results():
             word_panel.set_deck_id(deck_id)
+        self.check_existing_notes(self.search_results())
         self._save_config_value('deck', deck_id)
 
     def _on_notetype_changed(self, _index):
@@ -336,10 +413,96 @@ class SonaveebDialog(QWidget):
             self._form_selector.setVisible(len(forms) > 0)
             self._content_stack.setCurrentWidget(self._content)
             notetype = mw.col.models.get(self.notetype_id())
+            word_panels = []
             for reference in references:
-                word_panel = WordInfoPanel(reference, self._sonaveeb, self.deck_id(), notetype, self.language_code())
+                word_panel = WordInfoPanel(
+                    reference, self.deck_id(), notetype, self.language_code(), self._translation_batcher
+                )
                 word_panel.translations_requested.connect(self._on_word_translation_requested)
                 self._search_results_layout.addWidget(word_panel)
+                word_panels.append(word_panel)
+            self._request_word_infos(word_panels)
+            self._add_all_button.show()
+
+    def _on_word_info_received(self, generation, word_panel, future):
+        if generation != self._search_generation:
+            # Panel was deleted
+            return
+        try:
+            word_info = future.result()
+        except Exception as error:
+            print(error)
+            word_panel.set_status('Error :(')
+            return
+        if word_info is None:
+            word_panel.set_status('Failed to obtain word info :(')
+        else:
+            word_panel.set_word_info(word_info)
+            # Word infos arrive one by one, check their notes together
+            self._unchecked_panels.append(word_panel)
+            if not self._notes_check_timer.isActive():
+                self._notes_check_timer.start()
+
+    def _check_unchecked_panels(self):
+        word_panels, self._unchecked_panels = self._unchecked_panels, []
+        self.check_existing_notes(word_panels)
+
+    def _on_add_all_button_clicked(self):
+        word_panels = [p for p in self.search_results() if p.can_add_note()]
+        if not word_panels:
+            tooltip('Nothing to add', parent=self)
+            return
+        generation = self._search_generation
+        notetype = mw.col.models.get(self.notetype_id())
+        payloads = [p.note_payload() for p in word_panels]
+        self._add_all_button.setEnabled(False)
+        for word_panel in word_panels:
+            word_panel.set_adding(True)
+        CollectionOp(
+            parent=self,
+            op=lambda col: add_notes(col, notetype, payloads, progress=self._report_add_progress)
+        ).success(
+            lambda result: self._on_notes_added(generation, word_panels, result)
+        ).failure(
+            lambda error: self._on_add_notes_error(generation, word_panels, error)
+        ).run_in_background()
+
+    @staticmethod
+    def _report_add_progress(added, total):
+        mw.taskman.run_on_main(
+            lambda: mw.progress.update(label=f'Added {added} of {total} notes', value=added, max=total)
+        )
+
+    def _on_notes_added(self, generation, word_panels, result):
+        self._add_all_button.setEnabled(True)
+        self._end_adding(generation, word_panels)
+        tooltip(f'Added {result.count} notes', parent=self)
+        if generation == self._search_generation:
+            # Panels still exist
+            self.check_existing_notes(word_panels)
+
+    def _on_add_notes_error(self, generation, word_panels, error):
+        self._add_all_button.setEnabled(True)
+        self._end_adding(generation, word_panels)
+        QMessageBox.warning(self, 'Failed to add the notes', str(error))
+        if isinstance(error, AddNotesError) and error.added and generation == self._search_generation:
+            # Show the notes that were added before the failure
+            self.check_existing_notes(word_panels)
+
+    def _end_adding(self, generation, word_panels):
+        if generation == self._search_generation:
+            # Panels still exist
+            for word_panel in word_panels:
+                word_panel.set_adding(False)
+
+    def _on_word_infos_error(self, generation, word_panels, received, error):
+        print(error)
+        if generation != self._search_generation:
+            # Panels were deleted
+            return
+        for index, word_panel in enumerate(word_panels):
+            if index not in received:
+                word_panel.set_status('Error :(')
 
     def _on_search_error(self, error):
         print(error)
@@ -448,6 +611,8 @@ class SonaveebDialog(QWidget):
         for notetype, update in zip(notetypes, updates):
             if not update.is_empty():
                 self._notetype_manager.update_notetype(notetype)
+                # Fields of indexed notes might have changed
+                self._note_index.invalidate()
         # Hide update button
         self._notetype_update_button.hide()
         self._refresh_notetype_list()
@@ -0,0 +1,203 @@
+'''
+Background refresh of existing Sõnaveeb notes in a deck
+'''
+
+from aqt import mw, gui_hooks
+from aqt.qt import QObject, QMessageBox
+from aqt.operations import QueryOp, CollectionOp
+from aqt.utils import chooseList, showInfo, tooltip
+
+from ..notes import find_deck_notes, update_notes
+from ..refresh import RefreshStats, refresh_notes
+from ..resilience import RequestPolicy
+from ..globals import (
+    REQUEST_TIMEOUT, REQUEST_WORKERS, EXAMPLES_LIMIT,
+    REFRESH_REQUESTS_PER_SECOND, REFRESH_REQUEST_RETRIES, REFRESH_CIRCUIT_BREAKER_FAILURES
+)
+
+
+class NoteRefreshJob(QObject):
+    '''Refreshes notes of a deck chunk by chunk.
+
+    Words of every chunk are re-fetched in background, and changed notes are
+    updated with one collection operation. Requests of the whole deck are
+    rate limited and retried on their own, whatever the addon config says
+    about interactive requests. The job doesn't block the main
+    window: its progress is shown in tooltips, and it can be cancelled with
+    `cancel`.
+
+    After every chunk the last refreshed note and the notes that failed so far
+    are saved into the collection config as a checkpoint, so that an
+    interrupted or cancelled refresh can be resumed, and the failed notes
+    are retried then.
+    '''
+    CHUNK_SIZE = 20
+    CHECKPOINT_KEY = 'sonaveeb_refresh_checkpoint'
+    # Maximum number of failed notes listed in the summary
+    FAILURES_SHOWN = 10
+
+    def __init__(self, sonaveeb, notetype_manager, deck_id, parent=None):
+        super().__init__(parent)
+        self.sonaveeb = sonaveeb.with_policy(RequestPolicy(
+            rate=REFRESH_REQUESTS_PER_SECOND,
+            retries=REFRESH_REQUEST_RETRIES,
+            failure_threshold=REFRESH_CIRCUIT_BREAKER_FAILURES,
+        ))
+        self.notetype_manager = notetype_manager
+        self.deck_id = deck_id
+        self.stats = RefreshStats()
+        self._notes = []
+        self._position = 0
+        self._last_note_id = None
+        self._retried = set()
+        self._cancelled = False
+
+    def checkpoint(self):
+        '''Get checkpoint of the deck, or None.
+
+        Returns: dict, or None if there is nothing to resume
+            note_id: ID of the last refreshed note.
+            failed: IDs of the notes that failed to refresh.
+        '''
+        checkpoint = mw.col.get_config(self.CHECKPOINT_KEY, None)
+        if checkpoint and checkpoint.get('deck') == self.deck_id:
+            return dict(note_id=checkpoint.get('note_id'), failed=checkpoint.get('failed', []))
+        return None
+
+    def start(self, resume=True):
+        '''Start refreshing notes, after the checkpoint if `resume` is set.'''
+        checkpoint = self.checkpoint() if resume else None
+        notes = find_deck_notes(mw.col, self.notetype_manager, self.deck_id)
+        if checkpoint is not None:
+            self._last_note_id = checkpoint['note_id']
+            self._retried = set(checkpoint['failed'])
+            # Notes are ordered by ID, so the retried ones come first
+            notes = [n for n in notes if self._is_after_checkpoint(n.id) or n.id in self._retried]
+        self._notes = notes
+        self._position = 0
+        gui_hooks.profile_will_close.append(self.cancel)
+        self._next_chunk()
+
+    def cancel(self):
+        '''Stop the refresh after the current chunk. The refresh can be resumed later.'''
+        self._cancelled = True
+
+    def _is_after_checkpoint(self, note_id):
+        return self._last_note_id is None or note_id > self._last_note_id
+
+    def _next_chunk(self):
+        if self._position >= len(self._notes):
+            self._save_checkpoint()
+            self._finish('Refreshed')
+            return
+        if self._cancelled:
+            self._finish('Cancelled. The refresh can be resumed later.\n\nRefreshed')
+            return
+        tooltip(f'Refreshing Sõnaveeb notes: {self._position} of {len(self._notes)}', parent=mw)
+        chunk = self._notes[self._position:self._position + self.CHUNK_SIZE]
+        QueryOp(
+            parent=mw,
+            op=lambda col: refresh_notes(
+                self.sonaveeb, chunk,
+                max_workers=REQUEST_WORKERS,
+                timeout=REQUEST_TIMEOUT,
+                examples_limit=EXAMPLES_LIMIT,
+                stats=self.stats,
+            ),
+            success=lambda updates: self._apply_updates(chunk, updates)
+        ).failure(self._on_error).run_in_background()
+
+    def _apply_updates(self, chunk, updates):
+        if mw.col is None:
+            self._on_error('The collection was closed.')
+            return
+        CollectionOp(
+            parent=mw,
+            op=lambda col: update_notes(col, updates)
+        ).success(
+            lambda _: self._on_chunk_done(chunk)
+        ).failure(self._on_error).run_in_background()
+
+    def _on_chunk_done(self, chunk):
+        self._position += len(chunk)
+        if self._is_after_checkpoint(chunk[-1].id):
+            self._last_note_id = chunk[-1].id
+        self._save_checkpoint()
+        self._next_chunk()
+
+    def _save_checkpoint(self):
+        # Previously failed notes that haven't been retried yet stay failed
+        pending = [n.id for n in self._notes[self._position:] if n.id in self._retried]
+        failed = pending + [note_id for note_id, _ in self.stats.failures]
+        if self._position >= len(self._notes) and not failed:
+            mw.col.remove_config(self.CHECKPOINT_KEY)
+        else:
+            mw.col.set_config(
+                self.CHECKPOINT_KEY,
+                dict(deck=self.deck_id, note_id=self._last_note_id, failed=failed)
+            )
+
+    def _finish(self, message):
+        self._done()
+        s = self.stats
+        summary = f'{message} {s.checked} notes: {s.changed} updated, {s.unmatched} not recognized, {s.failed} failed.'
+        if s.failures:
+            summary += '\n\nFailed notes:\n' + '\n'.join(
+                f'{note_id}: {error}' for note_id, error in s.failures[:self.FAILURES_SHOWN]
+            )
+            if s.failed > self.FAILURES_SHOWN:
+                summary += f'\n... and {s.failed - self.FAILURES_SHOWN} more'
+            summary += '\n\nThe failed notes are retried when the refresh is resumed.'
+        showInfo(summary, parent=mw)
+
+    def _on_error(self, error):
+        self._done()
+        QMessageBox.warning(mw, 'Failed to refresh Sõnaveeb notes', f'{error}\n\nThe refresh can be resumed later.')
+
+    def _done(self):
+        global _running_job
+        gui_hooks.profile_will_close.remove(self.cancel)
+        if _running_job is self:
+            _running_job = None
+        self.deleteLater()
+
+
+# Only one refresh runs at a time
+_running_job = None
+
+
+def refresh_deck_notes(sonaveeb, notetype_manager):
+    '''Ask for a deck and refresh its Sõnaveeb notes against the dictionary.
+
+    If a refresh is already running, offer to cancel it instead.
+    '''
+    global _running_job
+    if _running_job is not None:
+        answer = QMessageBox.question(
+            mw,
+            'Cancel refresh?',
+            'Sõnaveeb notes are being refreshed. Would you like to cancel the refresh?',
+            QMessageBox.StandardButton.Yes,
+            QMessageBox.StandardButton.No
+        )
+        if answer == QMessageBox.StandardButton.Yes:
+            _running_job.cancel()
+        return
+    decks = mw.col.decks.all_names_and_ids()
+    index = chooseList('Refresh Sõnaveeb notes of the deck:', [d.name for d in decks], parent=mw)
+    if index is None or index < 0:
+        return
+    job = NoteRefreshJob(sonaveeb, notetype_manager, decks[index].id, parent=mw)
+    resume = False
+    if job.checkpoint() is not None:
+        answer = QMessageBox.question(
+            mw,
+            'Resume refresh?',
+            'The previous refresh of this deck was interrupted or some notes failed to refresh. '
+            'Would you like to resume it?',
+            QMessageBox.StandardButton.Yes,
+            QMessageBox.StandardButton.No
+        )
+        resume = answer == QMessageBox.StandardButton.Yes
+    _running_job = job
+    job.start(resume)
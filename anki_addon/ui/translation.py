@@ -0,0 +1,70 @@
+'''
+Batching of Google cross-translation requests from the whole dialog
+'''
+
+from typing import Callable, Dict, List
+from aqt.qt import QObject, QTimer
+from aqt.operations import QueryOp
+
+from ..gtranslate import batch_cross_translate
+from ..resilience import Deadline
+from ..globals import REQUEST_TIMEOUT, OPERATION_DEADLINE
+
+
+class CrossTranslationBatcher(QObject):
+    '''Collects cross-translation requests and sends them in batches.
+
+    Requests made within a short delay of each other, e.g. by all lexemes
+    of all word panels that have just been shown, are translated together
+    with `gtranslate.batch_cross_translate`, in one request per source language.
+    '''
+    BATCH_DELAY_MS = 100
+
+    def __init__(self, parent: QObject = None):
+        super().__init__(parent)
+        self._pending = []
+        self._timer = QTimer(self)
+        self._timer.setSingleShot(True)
+        self._timer.setInterval(self.BATCH_DELAY_MS)
+        self._timer.timeout.connect(self._flush)
+
+    def request(
+            self,
+            sources: Dict[str, List[str]],
+            lang: str,
+            on_success: Callable[[List[str]], None],
+            on_failure: Callable[[Exception], None]):
+        '''Request cross-translation, see `gtranslate.cross_translate`.
+
+        Callbacks are called on the main thread.
+        '''
+        self._pending.append((sources, lang, on_success, on_failure))
+        if not self._timer.isActive():
+            self._timer.start()
+
+    def _flush(self):
+        pending, self._pending = self._pending, []
+        for lang in {lang for _, lang, _, _ in pending}:
+            batch = [request for request in pending if request[1] == lang]
+            operation = QueryOp(
+                parent=self.parent(),
+                op=lambda col, batch=batch, lang=lang: batch_cross_translate(
+                    [sources for sources, _, _, _ in batch],
+                    lang=lang,
+                    timeout=REQUEST_TIMEOUT,
+                    deadline=Deadline(OPERATION_DEADLINE),
+                ),
+                success=lambda results, batch=batch: self._on_batch_received(batch, results)
+            ).failure(lambda error, batch=batch: self._on_batch_error(batch, error))
+            operation.run_in_background()
+
+    def _on_batch_received(self, batch, results):
+        for (_, _, on_success, on_failure), translations in zip(batch, results):
+            if translations is None:
+                on_failure(RuntimeError('Failed to translate'))
+            else:
+                on_success(translations)
+
+    def _on_batch_error(self, batch, error):
+        for _, _, _, on_failure in batch:
+            on_failure(error)
@@ -3,13 +3,12 @@ from aqt.qt import (
     Qt, QSizePolicy, QWidget, QHBoxLayout, QVBoxLayout, QLabel, QPushButton,
     QStackedWidget,QGroupBox, QMessageBox, pyqtSignal
 )
-from aqt.operations import QueryOp
 from aqt.theme import theme_manager
 from aqt import mw, colors
 
 from ..notetypes import NoteTypeManager
+from ..notes import NotePayload, fill_note, note_content
 from ..globals import (
-    REQUEST_TIMEOUT,
     TRANSLATIONS_LIMIT,
     EXAMPLES_LIMIT,
     LEXEMES_LIMIT,
@@ -22,7 +21,7 @@ from .lexeme import LexemesContainer, LexemeWidget
 class WordInfoPanel(QGroupBox):
     translations_requested = pyqtSignal(bool)
 
-    def __init__(self, word_reference, sonaveeb, deck_id, notetype, lang, parent=None):
+    def __init__(self, word_reference, deck_id, notetype, lang, translation_batcher, parent=None):
         super().__init__(parent=parent)
         # Set state
         self.deck_id = deck_id
@@ -31,7 +30,9 @@ class WordInfoPanel(QGroupBox):
         self.word_reference = word_reference
         self.word_info = None
         self.note = None
-        self._sonaveeb = sonaveeb
+        # Whether the add button would be enabled if no note was being added in background
+        self._add_allowed = False
+        self._adding = False
 
         # Add status label
         self._status_label = QLabel()
@@ -52,7 +53,8 @@ class WordInfoPanel(QGroupBox):
         self._lexemes_container = LexemesContainer(
             lexemes_limit=LEXEMES_LIMIT,
             examples_limit=EXAMPLES_LIMIT,
-            translations_limit=TRANSLATIONS_LIMIT
+            translations_limit=TRANSLATIONS_LIMIT,
+            translation_batcher=translation_batcher,
         )
         self._lexemes_container.lexeme_selected.connect(self._on_lexeme_selected)
         self._lexemes_container.translations_updated.connect(self._on_translations_updated)
@@ -108,9 +110,9 @@ class WordInfoPanel(QGroupBox):
         self.setLayout(layout)
         self.setSizePolicy(QSizePolicy.Policy.Expanding, QSizePolicy.Policy.Maximum)
 
-        # Request word info
+        # Word info is requested by the dialog for all panels at once
         self.set_notetype(notetype)
-        self.request_word_info()
+        self.set_status('Loading...')
 
     def set_translation_language(self, lang):
         '''Set translation language.
@@ -119,21 +121,22 @@ class WordInfoPanel(QGroupBox):
             lang: Target language code
         '''
         self.lang = lang
-        self._add_button.setEnabled(False)
+        self._set_add_allowed(False)
         self._replace_button.hide()
         self._lexemes_container.set_translation_language(lang)
 
     def set_deck_id(self, deck_id):
-        '''Set deck ID.'''
+        '''Set deck ID.
+
+        Existing note should be updated afterwards, see `set_existing_note`.
+        '''
         self.deck_id = deck_id
-        if self.word_info is not None:
-            self.check_note_exists()
 
     def set_notetype(self, notetype):
         self.notetype = notetype
         ok = notetype is not None
         tooltip = None if ok else 'Note type is missing!'
-        self._add_button.setEnabled(ok)
+        self._set_add_allowed(ok)
         self._add_button.setToolTip(tooltip)
         self._replace_button.setEnabled(ok)
         self._replace_button.setToolTip(tooltip)
@@ -156,27 +159,18 @@ class WordInfoPanel(QGroupBox):
         self._stack.setCurrentWidget(self._content)
         # Request translations
         self.set_translation_language(self.lang)
-        # Update buttons state
-        self.check_note_exists()
+        # Existing note is checked by the dialog for all panels at once
 
-    def check_note_exists(self):
-        '''Check if note for the current word exists.
+    def set_existing_note(self, note):
+        '''Set existing note of the current word, or None if it doesn't exist.
+
+        Args:
+            note: `anki.notes.Note` or `notes.IndexedNote`.
 
         Change visibility of add and delete buttons accordingly.
         '''
-        if self.word_info is None:
-            return
-        # Search note by Word ID (modern notes)
-        deck = mw.col.decks.get(self.deck_id)['name']
-        query = f'"Word ID:{self.word_info.word_id}" deck:"{deck}"'
-        notes = mw.col.find_notes(query)
-        if not notes:
-            # Fallback to search by URL (legacy notes)
-            query = f'URL:"{self.word_info.url}" deck:"{deck}"'
-            notes = mw.col.find_notes(query)
-        exists = len(notes) > 0
-        if exists:
-            self.note = mw.col.get_note(notes[0])
+        exists = note is not None
+        self.note = note
         # Update buttons visibility
         self._add_button.setVisible(not exists)
         self._delete_button.setVisible(exists)
@@ -205,6 +199,15 @@ class WordInfoPanel(QGroupBox):
         # Update button visibility
         self._replace_button.setVisible(exists and not identical)
 
+    def set_adding(self, adding):
+        '''Disable adding a note while it is being added in background, e.g. by "Add All".'''
+        self._adding = adding
+        self._set_add_allowed(self._add_allowed)
+
+    def can_add_note(self):
+        '''Check if a new note can be added for the current word.'''
+        return self.word_info is not None and self.note is None and self._add_button.isEnabled()
+
     def add_note(self):
         '''Add a new note to the collection'''
         note = mw.col.new_note(self.notetype)
@@ -215,11 +218,8 @@ class WordInfoPanel(QGroupBox):
     def update_note(self):
         '''Update an existing note with current data'''
         if self.note is not None:
-            # Update note content
-            # TODO: Check if note content is different
-            self.fill_note(self.note)
-            mw.col.update_note(self.note)
-            # Update note type if needed
+            # Update note type if needed. It is changed before the content,
+            # so that note index hooks see the final note
             old_ntid = self.note.mid
             new_ntid = self.notetype.get('id')
             if old_ntid != new_ntid:
@@ -228,8 +228,12 @@ class WordInfoPanel(QGroupBox):
                 print(request.note_ids)
                 request.note_ids.extend([self.note.id])
                 mw.col.models.change_notetype_of_notes(request)
-            # Re-read updated note from DB
-            self.note = mw.col.get_note(self.note.id)
+            # Update note content, the current note might be an index snapshot
+            # TODO: Check if note content is different
+            note = mw.col.get_note(self.note.id)
+            self.fill_note(note)
+            mw.col.update_note(note)
+            self.note = note
 
     def delete_note(self):
         if self.note is not None:
@@ -244,61 +248,23 @@ class WordInfoPanel(QGroupBox):
     def fill_note(self, note):
         '''Fill note with current lexeme data'''
         fields, tags = self.note_content()
-        for key, value in fields.items():
-            note[key] = value
-        for tag in tags:
-            note.add_tag(tag)
+        fill_note(note, fields, tags)
+
+    def note_payload(self):
+        '''Derive content of the note to be created, see `notes.add_notes`.'''
+        fields, tags = self.note_content()
+        return NotePayload(fields, tags, self.deck_id)
 
     def note_content(self):
         '''Derive fields and tags values for the note to be created'''
         lexeme_widget = self._lexemes_container.get_selected_widget()
-        lexeme = lexeme_widget.lexeme
-        # Populate fields
-        fields = {
-            'Word ID': self.word_info.word_id,
-            'Morphology': self.word_info.short_record(),
-            'URL': self.word_info.url,
-            'Translation': ', '.join(lexeme_widget.translations),
-            'Definition': lexeme.definition or '',
-            'Examples': '<br>'.join(lexeme.examples[:EXAMPLES_LIMIT]),
-            'Rection': ', '.join(lexeme.rection)
-        }
-        # Populate tags
-        tags = []
-        if self.word_info.word_class is not None:
-            tags.append(self.word_info.word_class)
-        if lexeme.level:
-            tags.append(lexeme.level)
-        return fields, tags
-
-    def request_word_info(self):
-        self.set_status('Loading...')
-        operation = QueryOp(
-            parent=self,
-            op=lambda col: self._sonaveeb.get_word_info_by_reference(
-                self.word_reference, timeout=REQUEST_TIMEOUT
-            ),
-            success=self._on_word_info_received
-        ).failure(self._on_word_request_error)
-        operation.run_in_background()
+        return note_content(self.word_info, lexeme_widget.lexeme, lexeme_widget.translations, EXAMPLES_LIMIT)
 
-    # Slots & callbacks
+    def _set_add_allowed(self, allowed):
+        self._add_allowed = allowed
+        self._add_button.setEnabled(allowed and not self._adding)
 
-    def _on_word_request_error(self, error):
-        print(error)
-        self.set_status('Error :(')
-
-    def _on_word_info_received(self, word_info):
-        # Test if this widget still exists
-        try:
-            self.isVisible()
-        except RuntimeError:
-            # Panel was deleted
-            return
-        if word_info is None:
-            self.set_status('Failed to obtain word info :(')
-        else:
-            self.set_word_info(word_info)
+    # Slots & callbacks
 
     def _on_add_button_clicked(self):
         self.add_note()
@@ -330,5 +296,5 @@ class WordInfoPanel(QGroupBox):
     def _on_translations_updated(self, lexeme_widget: LexemeWidget):
         if self._lexemes_container.get_selected_widget() is lexeme_widget:
             if len(lexeme_widget.translations) > 0:
-                self._add_button.setEnabled(self.notetype is not None)
+                self._set_add_allowed(self.notetype is not None)
                 self.check_note_identical()
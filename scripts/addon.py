@@ -0,0 +1,23 @@
+'''
+Access to the addon package from scripts.
+
+Importing this module registers the `anki_addon` package without running its
+`__init__`, which requires Anki, so it has to be imported before any module
+of the package.
+'''
+
+import os
+import sys
+import types
+
+
+ADDON_PATH = os.path.join(os.path.dirname(__file__), os.pardir, 'anki_addon')
+
+
+def register(path: str, name: str = 'anki_addon') -> None:
+    '''Register addon package in `path` as `name` without running its __init__.'''
+    sys.modules[name] = types.ModuleType(name)
+    sys.modules[name].__path__ = [path]
+
+
+register(ADDON_PATH)
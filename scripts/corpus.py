@@ -0,0 +1,87 @@
+'''
+Recorded HTTP responses for offline testing.
+
+Responses are stored as plain files laid out by host and URL path, e.g.
+`<root>/sonaveeb.ee/search/lite/dlall/tee`. Path segments are percent-encoded,
+and URL query, if any, is appended to the last segment.
+'''
+
+import os
+import re
+import typing as tp
+from urllib.parse import urlsplit, quote, unquote, parse_qsl
+
+import addon  # Registers anki_addon package, must precede imports from it
+from anki_addon.sonaveeb import Sonaveeb
+from anki_addon import gtranslate
+
+
+class Corpus:
+    def __init__(self, root: str):
+        self.root = root
+
+    def path(self, url: str) -> str:
+        '''Get file path of a recorded response for URL.'''
+        parts = urlsplit(url)
+        segments = [unquote(s) for s in parts.path.strip('/').split('/')]
+        if parts.query:
+            segments[-1] += '?' + unquote(parts.query)
+        return os.path.join(self.root, parts.netloc, *[quote(s, safe='') for s in segments])
+
+    def url(self, path: str) -> str:
+        '''Get URL of a recorded response from its file path.'''
+        host, *segments = os.path.relpath(path, self.root).split(os.sep)
+        segments = [unquote(s) for s in segments]
+        # Keep the query encoded, as it may contain e.g. newlines of batch translations
+        last, sep, query = segments[-1].partition('?')
+        segments[-1] = last + sep + quote(query, safe='&=')
+        return f'https://{host}/' + '/'.join(segments)
+
+    def save(self, url: str, text: str) -> None:
+        path = self.path(url)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'w') as file:
+            file.write(text)
+
+    def load(self, url: str) -> tp.Optional[str]:
+        path = self.path(url)
+        if not os.path.isfile(path):
+            return None
+        with open(path, 'r') as file:
+            return file.read()
+
+    def urls(self) -> tp.List[str]:
+        '''List URLs of all recorded responses.'''
+        urls = []
+        for dirpath, _dirnames, filenames in os.walk(self.root):
+            urls += [self.url(os.path.join(dirpath, f)) for f in filenames]
+        return sorted(urls)
+
+
+def _template_regex(template):
+    pattern = re.escape(template)
+    pattern = re.sub(r'\\\{(\w+)\\\}', r'(?P<\1>[^/]+)', pattern)
+    return re.compile(f'^{pattern}$')
+
+
+SONAVEEB_PATTERNS = [
+    (mode, kind, _template_regex(getattr(urls, kind)))
+    for mode, urls in Sonaveeb.MODE_URLS.items()
+    for kind in ('forms', 'search', 'details')
+]
+
+
+def classify(url: str):
+    '''Identify recorded response.
+
+    Returns: tuple or None if URL is not recognized
+        mode: SonaveebMode, or None for Google Translate
+        kind: 'forms', 'search', 'details', or 'gtranslate'
+        params: URL parameters, e.g. `{'word': 'tee'}`
+    '''
+    for mode, kind, regex in SONAVEEB_PATTERNS:
+        if match := regex.match(url):
+            return mode, kind, match.groupdict()
+    if url.startswith(gtranslate.BASE_URL + '/m?'):
+        return None, 'gtranslate', dict(parse_qsl(urlsplit(url).query))
+    return None
@@ -0,0 +1,60 @@
+#!/usr/bin/env python
+
+import time
+import argparse
+import statistics
+
+import addon  # Registers anki_addon package, must precede imports from it
+
+from anki_addon.gtranslate import GoogleTranslate
+
+
+def measure(get_client, texts, args):
+    '''Measure latency of every translation in seconds.'''
+    latencies = []
+    for text in texts:
+        client = get_client()
+        start = time.perf_counter()
+        client.translate(text, target_lang=args.target_lang, source_lang=args.source_lang, timeout=args.timeout)
+        latencies.append(time.perf_counter() - start)
+    return latencies
+
+
+def report(name, latencies):
+    print(
+        f'{name:6} {len(latencies):6} {statistics.mean(latencies) * 1000:10.1f}'
+        f' {statistics.median(latencies) * 1000:10.1f} {max(latencies) * 1000:10.1f}'
+    )
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser('Compare latency of Google Translate requests on cold and warm connections, and in batches')
+    parser.add_argument('texts', nargs='*', default=['tee', 'maja', 'raamat', 'koer', 'kass'], help='Texts to translate')
+    parser.add_argument('--source-lang', default='et', help='Source language (ISO-639 code)')
+    parser.add_argument('--target-lang', default='en', help='Target language (ISO-639 code)')
+    parser.add_argument('--base-url', help='Send requests to this server instead, e.g. stand_in_server.py')
+    parser.add_argument('--repeat', type=int, default=5, help='Number of times to translate every text')
+    parser.add_argument('--timeout', type=float, default=10, help='Request timeout in seconds')
+    args = parser.parse_args()
+
+    texts = args.texts * args.repeat
+    # Cold: a new session for every request, as with plain `requests.get`
+    cold = measure(lambda: GoogleTranslate(base_url=args.base_url), texts, args)
+    # Warm: one session, its connection is established by a request before measuring
+    client = GoogleTranslate(base_url=args.base_url)
+    client.translate(texts[0], target_lang=args.target_lang, source_lang=args.source_lang, timeout=args.timeout)
+    warm = measure(lambda: client, texts, args)
+
+    print(f'{"":6} {"count":>6} {"mean ms":>10} {"median ms":>10} {"max ms":>10}')
+    report('cold', cold)
+    report('warm', warm)
+
+    # Batch: all distinct texts in one request, compared to one request per text on a warm connection
+    unique = list(dict.fromkeys(args.texts))
+    batch = []
+    for _ in range(args.repeat):
+        start = time.perf_counter()
+        client.translate_batch(unique, target_lang=args.target_lang, source_lang=args.source_lang, timeout=args.timeout)
+        batch.append(time.perf_counter() - start)
+    print(f'\nAll {len(unique)} texts: {sum(warm) / args.repeat * 1000:.1f} ms one by one'
+          f', {statistics.mean(batch) * 1000:.1f} ms in a batch')
@@ -1,13 +1,14 @@
 #!/usr/bin/env python
 
-import os
-import sys
 import argparse
 
-ADDON_PATH = os.path.join(os.path.dirname(__file__), os.pardir, 'anki_addon')
-sys.path.append(ADDON_PATH)
+import addon  # Registers anki_addon package, must precede imports from it
 
-import gtranslate
+import requests
+
+from anki_addon import gtranslate
+from anki_addon.cache import ResponseCache
+from corpus import Corpus
 
 
 if __name__ == '__main__':
@@ -16,11 +17,28 @@ if __name__ == '__main__':
     parser.add_argument('--source-lang', default='et', help='Source language (ISO-639 code)')
     parser.add_argument('--target-lang', default='en', help='Target language (ISO-639 code)')
     parser.add_argument('--debug', action='store_true', help='Save HTML page before parsing for debugging')
+    parser.add_argument('--base-url', help='Send requests to this server instead, e.g. stand_in_server.py')
+    parser.add_argument('--cache', help='Translation cache file to use (SQLite)')
+    parser.add_argument('--seed', metavar='FILE', help='Fill translation cache from JSON file')
+    parser.add_argument('--record', metavar='DIR', help='Record raw response into the directory for offline tests')
     args = parser.parse_args()
 
-    result = gtranslate.translate(
-        text=args.text,
-        target_lang=args.target_lang,
-        source_lang=args.source_lang,
-        debug=args.debug)
+    cache = ResponseCache(args.cache) if args.cache else None
+    gtranslate.set_client(gtranslate.GoogleTranslate(base_url=args.base_url, cache=cache))
+    if args.seed:
+        print(f'Seeded {gtranslate.get_client().seed_cache(args.seed)} translations')
+    if args.record:
+        url = gtranslate.get_client().url(args.text, args.target_lang, args.source_lang)
+        resp = requests.get(url)
+        resp.raise_for_status()
+        Corpus(args.record).save(resp.url, resp.text)
+        result = gtranslate._parse_translation(resp.text)
+    else:
+        result = gtranslate.translate(
+            text=args.text,
+            target_lang=args.target_lang,
+            source_lang=args.source_lang,
+            debug=args.debug)
     print(result)
+    if cache is not None:
+        print(cache.stats())
@@ -0,0 +1,138 @@
+#!/usr/bin/env python
+
+import sys
+import json
+import time
+import argparse
+import importlib
+import tracemalloc
+from collections import defaultdict
+
+import addon  # Registers anki_addon package, must precede imports from it
+
+from anki_addon.sonaveeb import HTML_PARSERS
+from corpus import Corpus, classify
+
+
+def load_addon(path):
+    '''Import Sonaveeb and Google Translate modules of the addon package in `path`.
+
+    The package is registered under a name of its own, so that e.g. a checkout
+    of an older revision can be benchmarked on the same corpus.
+    '''
+    if path is None:
+        name = 'anki_addon'
+    else:
+        name = 'benchmarked_addon'
+        addon.register(path, name)
+    return importlib.import_module(f'{name}.sonaveeb'), importlib.import_module(f'{name}.gtranslate')
+
+
+def measure(func, repeat):
+    '''Measure the best run time in seconds and peak memory allocation in bytes of a function.'''
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - start)
+    # Measure memory separately, as tracing slows down execution
+    tracemalloc.start()
+    func()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return best, peak
+
+
+def page_benchmarks(sv, gtranslate, corpus, args):
+    '''Generate (benchmark name, page label, function) for every recorded page.'''
+    # Older revisions parse all lexemes and have no limit arguments
+    limits = dict(lexemes_limit=args.lexemes_limit, examples_limit=args.examples_limit)
+    limits = {k: v for k, v in limits.items() if v is not None}
+    for url in corpus.urls():
+        recognized = classify(url)
+        if recognized is None:
+            continue
+        mode, kind, params = recognized
+        text = corpus.load(url)
+        if kind == 'search':
+            yield f'search/{mode.name}', params['word'], lambda: sv._parse_search_results(sv._make_dom(text))
+        elif kind == 'details':
+            info = sv._parse_word_info(sv._make_dom(text))
+            if len(info.lexemes) < args.min_lexemes:
+                continue
+            label = f'{params["word_id"]} {info.word} ({len(info.lexemes)} lexemes)'
+            yield f'details/{mode.name}', label, lambda: sv._parse_word_info(sv._make_dom(text), **limits)
+            yield 'short_record', label, info.short_record
+        elif kind == 'gtranslate' and hasattr(gtranslate, '_parse_translation'):
+            yield 'gtranslate', params.get('q', ''), lambda: gtranslate._parse_translation(text)
+            if hasattr(gtranslate, '_parse_translation_dom'):
+                yield 'gtranslate/dom', params.get('q', ''), lambda: gtranslate._parse_translation_dom(text)
+
+
+def compare(results, baseline, tolerance):
+    '''Print comparison with baseline results and return the number of regressions.'''
+    regressions = 0
+    print(f'\n{"benchmark":24} {"time":>14} {"peak memory":>14}')
+    for name, result in results.items():
+        if name not in baseline:
+            print(f'{name:24} {"new":>14} {"new":>14}')
+            continue
+        row = f'{name:24}'
+        # Compare time per page, as the corpus might have changed
+        current = (result['time'] / result['pages'], result['peak'])
+        previous = (baseline[name]['time'] / baseline[name]['pages'], baseline[name]['peak'])
+        for value, reference in zip(current, previous):
+            ratio = value / reference if reference else 1.0
+            regressed = ratio > 1.0 + tolerance
+            regressions += regressed
+            row += f' {ratio - 1.0:+13.0%}{"!" if regressed else " "}'
+        print(row)
+    return regressions
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser('Benchmark parsing of recorded Sõnaveeb and Google Translate pages')
+    parser.add_argument('corpus', help='Directory with recorded responses (see sonaveeb_test.py and gtranslate_test.py --record)')
+    parser.add_argument('--html-parser', choices=HTML_PARSERS, help='HTML parser to use')
+    parser.add_argument('--addon', metavar='DIR', help='Benchmark addon package in DIR, e.g. of an older revision, instead of this one')
+    parser.add_argument('--min-lexemes', type=int, default=0, help='Only benchmark details pages with at least this many lexemes')
+    parser.add_argument('--lexemes-limit', type=int, help='Maximum number of lexemes to parse')
+    parser.add_argument('--examples-limit', type=int, help='Maximum number of examples to parse per lexeme')
+    parser.add_argument('--repeat', type=int, default=20, help='Number of runs per page, the best one is reported')
+    parser.add_argument('--verbose', action='store_true', help='Print results for every page')
+    parser.add_argument('--save-baseline', metavar='FILE', help='Save results as a baseline into JSON file')
+    parser.add_argument('--baseline', metavar='FILE', help='Compare results with a baseline from JSON file')
+    parser.add_argument('--tolerance', type=float, default=0.2, help='Allowed relative slowdown or memory growth')
+    args = parser.parse_args()
+
+    sonaveeb, gtranslate = load_addon(args.addon)
+    sv = sonaveeb.Sonaveeb(html_parser=args.html_parser)
+    corpus = Corpus(args.corpus)
+    results = defaultdict(lambda: dict(pages=0, time=0.0, peak=0))
+    for name, label, func in page_benchmarks(sv, gtranslate, corpus, args):
+        elapsed, peak = measure(func, args.repeat)
+        result = results[name]
+        result['pages'] += 1
+        result['time'] += elapsed
+        result['peak'] = max(result['peak'], peak)
+        if args.verbose:
+            print(f'{name:24} {label:40} {elapsed * 1000:8.3f} ms {peak / 1024:8.0f} KiB')
+    results = dict(sorted(results.items()))
+
+    print(f'\nHTML parser: {sv.html_parser}')
+    print(f'{"benchmark":24} {"pages":>6} {"ms/page":>10} {"peak KiB":>10}')
+    for name, result in results.items():
+        print(f'{name:24} {result["pages"]:6} {result["time"] / result["pages"] * 1000:10.3f} {result["peak"] / 1024:10.0f}')
+
+    if args.save_baseline:
+        with open(args.save_baseline, 'w') as file:
+            json.dump(dict(html_parser=sv.html_parser, results=results), file, indent=4)
+    if args.baseline:
+        with open(args.baseline, 'r') as file:
+            baseline = json.load(file)
+        if baseline['html_parser'] != sv.html_parser:
+            print(f'Warning: baseline was measured with {baseline["html_parser"]} HTML parser')
+        regressions = compare(results, baseline['results'], args.tolerance)
+        if regressions:
+            print(f'{regressions} regressions beyond {args.tolerance:.0%} tolerance')
+            sys.exit(1)
@@ -0,0 +1,68 @@
+#!/usr/bin/env python
+
+import os
+import sys
+import argparse
+
+import addon  # Registers anki_addon package, must precede imports from it
+
+from anki_addon.sonaveeb import Sonaveeb, HTML_PARSERS
+from anki_addon import gtranslate
+from corpus import Corpus, classify
+
+
+# Small corpus of recorded lookup, details and translation pages
+FIXTURES = os.path.join(os.path.dirname(__file__), 'fixtures')
+
+
+def parse(sv, kind, text):
+    '''Parse recorded page into comparable output.'''
+    dom = sv._make_dom(text)
+    if kind == 'search':
+        references = sv._parse_search_results(dom)
+        # Include homonym details embedded into the lookup page
+        infos = [
+            sv._parse_word_info(dom, word_id=r.word_id)
+            for r in references
+            if sv._has_word_details(dom, r.word_id)
+        ]
+        return references, infos
+    elif kind == 'details':
+        return sv._parse_word_info(dom)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser('Check that all HTML parsers, and the Google Translate fast path, produce identical results on recorded pages')
+    parser.add_argument('corpus', nargs='?', default=FIXTURES,
+                        help='Directory with recorded responses (see sonaveeb_test.py and gtranslate_test.py --record), the fixtures by default')
+    parser.add_argument('--parsers', nargs='+', default=HTML_PARSERS, help='HTML parsers to compare')
+    args = parser.parse_args()
+
+    clients = [Sonaveeb(html_parser=p) for p in args.parsers]
+    corpus = Corpus(args.corpus)
+    checked = 0
+    mismatches = 0
+    for url in corpus.urls():
+        recognized = classify(url)
+        if recognized is None or recognized[1] == 'forms':
+            continue
+        _mode, kind, _params = recognized
+        text = corpus.load(url)
+        if kind == 'gtranslate':
+            # Compare the fast scan with the DOM
+            fast, dom = gtranslate._parse_translation(text), gtranslate._parse_translation_dom(text)
+            checked += 1
+            if fast != dom:
+                mismatches += 1
+                print(f'MISMATCH {url}: scan {fast!r} != DOM {dom!r}')
+            continue
+        results = [parse(sv, kind, text) for sv in clients]
+        checked += 1
+        for name, result in zip(args.parsers[1:], results[1:]):
+            if result != results[0]:
+                mismatches += 1
+                print(f'MISMATCH {url}: {args.parsers[0]} != {name}')
+                print(f'  {args.parsers[0]}: {results[0]}')
+                print(f'  {name}: {result}')
+    print(f'Checked {checked} pages with {", ".join(args.parsers)}: {mismatches} mismatches')
+    sys.exit(1 if mismatches else 0)
@@ -1,13 +1,14 @@
 #!/usr/bin/env python
 
-import os
-import sys
+import asyncio
 import argparse
 
-ADDON_PATH = os.path.join(os.path.dirname(__file__), os.pardir, 'anki_addon')
-sys.path.append(ADDON_PATH)
+import addon  # Registers anki_addon package, must precede imports from it
 
-from sonaveeb import Sonaveeb, SonaveebMode
+from anki_addon.sonaveeb import Sonaveeb, AsyncSonaveeb, SonaveebMode, HTML_PARSERS
+from anki_addon.cache import ResponseCache
+from anki_addon.resilience import RequestPolicy
+from corpus import Corpus
 
 
 if __name__ == '__main__':
@@ -19,10 +20,35 @@ if __name__ == '__main__':
                        choices=[m.name for m in SonaveebMode],
                        help='Sonaveeb mode to use')
     parser.add_argument('--debug', action='store_true', help='Save HTML pages before parsing for debugging')
+    parser.add_argument('--cache', help='Response cache file to use (SQLite)')
+    parser.add_argument('--html-parser', choices=HTML_PARSERS, help='HTML parser to use')
+    parser.add_argument('--base-url', help='Send requests to this server instead, e.g. stand_in_server.py')
+    parser.add_argument('--async', dest='use_async', action='store_true', help='Use asyncio client')
+    parser.add_argument('--rate', type=float, help='Maximum average number of requests per second')
+    parser.add_argument('--retries', type=int, default=0, help='Maximum number of retries of a failed request')
+    parser.add_argument('--hedge-percentile', type=float, help='Hedge requests slower than this latency percentile')
+    parser.add_argument('--record', metavar='DIR', help='Record raw responses into the directory for offline tests')
     args = parser.parse_args()
 
-    sv = Sonaveeb()
+    cache = ResponseCache(args.cache) if args.cache else None
+    policy = RequestPolicy(rate=args.rate, retries=args.retries)
+    sv = Sonaveeb(cache=cache, html_parser=args.html_parser, base_url=args.base_url, policy=policy,
+                  hedge_percentile=args.hedge_percentile)
+    if args.record:
+        corpus = Corpus(args.record)
+        def record(resp, *_args, **_kwargs):
+            if resp.status_code == 200 and resp.url.rstrip('/') != sv.base_url:
+                corpus.save(resp.url, resp.text)
+        sv.session.hooks['response'].append(record)
     sv.set_mode(SonaveebMode[args.mode])
-    info = sv.get_word_info(args.word, debug=args.debug)
+    if args.use_async:
+        info = asyncio.run(AsyncSonaveeb(sv).get_word_info(args.word, debug=args.debug))
+    else:
+        info = sv.get_word_info(args.word, debug=args.debug)
     print(info.summary(lang=args.lang))
+    print(policy.stats())
+    if sv.hedger is not None:
+        print(sv.hedger.stats())
+    if cache is not None:
+        print(cache.stats())
 
@@ -0,0 +1,142 @@
+#!/usr/bin/env python
+
+'''
+Local stand-in server for sonaveeb.ee and Google Translate.
+
+It replays responses recorded into a corpus directory (see corpus.py), with
+optional latency and error injection. In recording mode, requests missing
+from the corpus are proxied to the real servers and recorded.
+
+Point the clients to it with `Sonaveeb(base_url=...)` and
+`gtranslate.set_base_url(...)`, or with `--base-url` option of test scripts.
+
+Injected latency and errors are pseudo-random, but deterministic for a given
+seed: they depend only on the request path and how many times it has been
+requested before, not on the order of concurrent requests.
+'''
+
+import time
+import random
+import argparse
+import threading
+from collections import Counter
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+import addon  # Registers anki_addon package, must precede imports from it
+
+import requests
+
+from anki_addon.sonaveeb import Sonaveeb
+from anki_addon import gtranslate
+from corpus import Corpus
+
+
+SESSION_COOKIE = 'ww-sess=stand-in; Path=/'
+
+
+class StandInHandler(BaseHTTPRequestHandler):
+    # Keep connections alive like the real servers do. Headers and body
+    # are written separately, so Nagle's algorithm would delay the body.
+    protocol_version = 'HTTP/1.1'
+    disable_nagle_algorithm = True
+    # Set by serve()
+    corpus: Corpus = None
+    args: argparse.Namespace = None
+    upstream: requests.Session = None
+    lock = threading.Lock()
+    counts = Counter()
+
+    def do_GET(self):
+        rng = self._rng()
+        self._inject_latency(rng)
+        if rng.random() < self.args.error_rate:
+            self._respond(self.args.error_status, 'Injected error')
+        elif self.path == '/':
+            # Session bootstrap
+            self._respond(200, '<html></html>', cookie=SESSION_COOKIE)
+        elif (text := self._load()) is not None:
+            self._respond(200, text)
+        else:
+            self._respond(404, 'Not recorded')
+
+    def _rng(self):
+        with self.lock:
+            self.counts[self.path] += 1
+            n = self.counts[self.path]
+        return random.Random(f'{self.args.seed}:{self.path}:{n}')
+
+    def _inject_latency(self, rng):
+        delay = self.args.latency + rng.uniform(-self.args.jitter, self.args.jitter)
+        if rng.random() < self.args.tail_rate:
+            delay += self.args.tail_latency
+        if delay > 0:
+            time.sleep(delay / 1000)
+
+    def _upstream_url(self):
+        if self.path.startswith('/m?'):
+            return gtranslate.BASE_URL + self.path
+        return Sonaveeb.BASE_URL + self.path
+
+    def _load(self):
+        url = self._upstream_url()
+        text = self.corpus.load(url)
+        if text is None and self.args.record:
+            text = self._record(url)
+        return text
+
+    def _record(self, url):
+        with self.lock:
+            if url.startswith(Sonaveeb.BASE_URL) and 'ww-sess' not in self.upstream.cookies:
+                self.upstream.get(Sonaveeb.BASE_URL, timeout=self.args.upstream_timeout)
+        resp = self.upstream.get(url, timeout=self.args.upstream_timeout)
+        if resp.status_code != 200:
+            self.log_message('Upstream request failed: %s %s', resp.status_code, url)
+            return None
+        self.corpus.save(url, resp.text)
+        self.log_message('Recorded %s', url)
+        return resp.text
+
+    def _respond(self, status, text, cookie=None):
+        body = text.encode()
+        is_json = text.lstrip().startswith(('{', '['))
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json' if is_json else 'text/html; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        if cookie is not None:
+            self.send_header('Set-Cookie', cookie)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        if not self.args.quiet:
+            super().log_message(format, *args)
+
+
+def serve(args):
+    StandInHandler.corpus = Corpus(args.corpus)
+    StandInHandler.args = args
+    StandInHandler.upstream = requests.Session()
+    server = ThreadingHTTPServer((args.host, args.port), StandInHandler)
+    print(f'Serving {args.corpus} on http://{args.host}:{server.server_port}')
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser('Local stand-in server for sonaveeb.ee and Google Translate')
+    parser.add_argument('corpus', help='Directory with recorded responses')
+    parser.add_argument('--host', default='127.0.0.1', help='Address to listen on')
+    parser.add_argument('--port', type=int, default=8000, help='Port to listen on')
+    parser.add_argument('--record', action='store_true', help='Proxy requests missing from the corpus to the real servers and record them')
+    parser.add_argument('--upstream-timeout', type=float, default=10, help='Timeout of requests to the real servers in seconds')
+    parser.add_argument('--latency', type=float, default=0, help='Response latency in milliseconds')
+    parser.add_argument('--jitter', type=float, default=0, help='Random latency deviation in milliseconds')
+    parser.add_argument('--tail-latency', type=float, default=0, help='Extra latency of slow responses in milliseconds')
+    parser.add_argument('--tail-rate', type=float, default=0, help='Fraction of slow responses')
+    parser.add_argument('--error-rate', type=float, default=0, help='Fraction of responses failing with an error')
+    parser.add_argument('--error-status', type=int, default=503, help='HTTP status of injected errors')
+    parser.add_argument('--seed', default='0', help='Seed for injected latency and errors')
+    parser.add_argument('--quiet', action='store_true', help='Do not log requests')
+    serve(parser.parse_args())